@@ -0,0 +1,262 @@
+"""
+Item-similarity search engines used to build the neighbor index.
+
+All engines index L2-normalized item rating vectors and answer item-to-item
+top-K cosine queries:
+
+- 'brute': exact, one sparse product against every item per query block
+- 'lsh':   random-hyperplane LSH over a truncated-SVD embedding; items
+           sharing a bucket in any table are candidates
+- 'ivf':   inverted file over a spherical k-means clustering of the same
+           embedding; items in the n_probe closest clusters are candidates
+
+Candidates from the approximate engines are re-ranked with exact cosine on
+the sparse rating vectors, so only recall (never similarity values) is
+traded for speed.
+
+Pick one with ANN_BACKEND / ANN_OPTIONS in config.py, and compare them with
+benchmarks/ann_recall.py.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import svds
+
+
+def normalize_rows(matrix):
+    """L2-normalize the rows of a sparse matrix (all-zero rows stay zero)"""
+    matrix = sp.csr_matrix(matrix, dtype=np.float32)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sp.csr_matrix(sp.diags((1.0 / norms).astype(np.float32)) @ matrix)
+
+
+def topk_rows(similarities, k, exclude=None):
+    """
+    Select the k most similar columns per row of a dense similarity block.
+
+    exclude gives one column per row to skip (the query item itself).
+    Columns with similarity <= 0 are padding (-1 ids, 0 similarity).
+    """
+    n_rows, n_cols = similarities.shape
+    k = min(k, n_cols - 1) if n_cols > 1 else 0
+    ids = np.full((n_rows, k), -1, dtype=np.int32)
+    sims = np.zeros((n_rows, k), dtype=np.float32)
+    if k == 0:
+        return ids, sims
+
+    if exclude is not None:
+        similarities[np.arange(n_rows), exclude] = -np.inf
+
+    top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    top_sims = np.take_along_axis(similarities, top, axis=1)
+    order = np.argsort(-top_sims, axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    top_sims = np.take_along_axis(top_sims, order, axis=1)
+
+    # Unrelated movies (no co-ratings) are padding, not neighbors
+    valid = top_sims > 0
+    ids[valid] = top[valid]
+    sims[valid] = top_sims[valid]
+    return ids, sims
+
+
+def svd_embedding(vectors, dim, seed=0):
+    """Unit-length rows of a rank-dim truncated SVD of a sparse matrix"""
+    dim = max(1, min(dim, min(vectors.shape) - 1))
+    if min(vectors.shape) <= 2 * dim:
+        # Tiny catalogs (e.g. the dummy data): a dense SVD is cheaper than ARPACK
+        u, s, _ = np.linalg.svd(vectors.toarray(), full_matrices=False)
+        u, s = u[:, :dim], s[:dim]
+    else:
+        v0 = np.random.default_rng(seed).random(min(vectors.shape))
+        u, s, _ = svds(vectors.astype(np.float64), k=dim, v0=v0)
+    embedded = (u * s).astype(np.float32)
+    norms = np.linalg.norm(embedded, axis=1, keepdims=True)
+    return embedded / np.where(norms > 0, norms, 1.0)
+
+
+def _nbytes(*arrays):
+    total = 0
+    for array in arrays:
+        if sp.issparse(array):
+            total += array.data.nbytes + array.indices.nbytes + array.indptr.nbytes
+        elif array is not None:
+            total += array.nbytes
+    return total
+
+
+class BruteForceEngine:
+    """Exact cosine search: sparse product of the query block with every item"""
+
+    name = 'brute'
+
+    def fit(self, item_vectors):
+        self.vectors = normalize_rows(item_vectors)
+        self.vectors_t = self.vectors.T.tocsc()
+        return self
+
+    def query(self, rows, k):
+        rows = np.asarray(rows)
+        block = (self.vectors[rows] @ self.vectors_t).toarray()
+        return topk_rows(block, k, exclude=rows)
+
+    def memory_bytes(self):
+        return _nbytes(self.vectors, self.vectors_t)
+
+
+class CandidateEngine:
+    """Base for engines that shortlist candidates and re-rank them exactly"""
+
+    name = None
+
+    def fit(self, item_vectors):
+        self.vectors = normalize_rows(item_vectors)
+        self.active = np.diff(self.vectors.indptr) > 0
+        self._fit_candidates()
+        return self
+
+    def _fit_candidates(self):
+        raise NotImplementedError
+
+    def candidates(self, row):
+        raise NotImplementedError
+
+    def query(self, rows, k):
+        rows = np.asarray(rows)
+        ids = np.full((len(rows), k), -1, dtype=np.int32)
+        sims = np.zeros((len(rows), k), dtype=np.float32)
+        for i, row in enumerate(rows):
+            if not self.active[row]:
+                continue
+            candidates = self.candidates(row)
+            candidates = candidates[candidates != row]
+            if len(candidates) == 0:
+                continue
+            scores = (self.vectors[candidates] @ self.vectors[row].T).toarray().ravel()
+            top = np.argsort(-scores, kind='stable')[:k]
+            top = top[scores[top] > 0]
+            ids[i, :len(top)] = candidates[top]
+            sims[i, :len(top)] = scores[top]
+        return ids, sims
+
+
+class LSHEngine(CandidateEngine):
+    """Random-hyperplane LSH with n_tables independent n_bits-bit hashes"""
+
+    name = 'lsh'
+
+    def __init__(self, n_tables=16, n_bits=8, dim=64, seed=0):
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.dim = dim
+        self.seed = seed
+
+    def _fit_candidates(self):
+        rng = np.random.default_rng(self.seed)
+        self.embedded = svd_embedding(self.vectors, self.dim, self.seed)
+        planes = rng.standard_normal((self.embedded.shape[1], self.n_tables * self.n_bits))
+
+        bits = (self.embedded @ planes > 0).reshape(-1, self.n_tables, self.n_bits)
+        weights = (1 << np.arange(self.n_bits)).astype(np.int64)
+        self.codes = (bits * weights).sum(axis=2)
+
+        # Per table: item ids sorted by code, so a bucket is a searchsorted range.
+        # Items without ratings are left out; they would all share one bucket.
+        active_ids = np.flatnonzero(self.active).astype(np.int32)
+        self.bucket_items = []
+        self.bucket_codes = []
+        for table in range(self.n_tables):
+            codes = self.codes[active_ids, table]
+            order = np.argsort(codes, kind='stable')
+            self.bucket_items.append(active_ids[order])
+            self.bucket_codes.append(codes[order])
+
+    def candidates(self, row):
+        found = []
+        for table in range(self.n_tables):
+            code = self.codes[row, table]
+            codes = self.bucket_codes[table]
+            lo = np.searchsorted(codes, code, side='left')
+            hi = np.searchsorted(codes, code, side='right')
+            found.append(self.bucket_items[table][lo:hi])
+        return np.unique(np.concatenate(found))
+
+    def memory_bytes(self):
+        return _nbytes(self.vectors, self.embedded, self.codes,
+                       *self.bucket_items, *self.bucket_codes)
+
+
+class IVFEngine(CandidateEngine):
+    """Inverted file over spherical k-means clusters of an SVD embedding"""
+
+    name = 'ivf'
+
+    def __init__(self, n_lists=None, n_probe=8, dim=64, n_iter=10, seed=0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.dim = dim
+        self.n_iter = n_iter
+        self.seed = seed
+
+    def _assign(self, embedded, chunk_size=8192):
+        labels = np.empty(len(embedded), dtype=np.int32)
+        for start in range(0, len(embedded), chunk_size):
+            block = embedded[start:start + chunk_size] @ self.centroids.T
+            labels[start:start + chunk_size] = block.argmax(axis=1)
+        return labels
+
+    def _fit_candidates(self):
+        rng = np.random.default_rng(self.seed)
+        self.embedded = svd_embedding(self.vectors, self.dim, self.seed)
+
+        active_ids = np.flatnonzero(self.active).astype(np.int32)
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(active_ids))))
+        n_lists = max(1, min(n_lists, len(active_ids)))
+        seeds = rng.choice(active_ids, n_lists, replace=False) if len(active_ids) else []
+        self.centroids = self.embedded[seeds].copy()
+
+        active_embedded = self.embedded[active_ids]
+        labels = np.zeros(len(active_ids), dtype=np.int32)
+        for _ in range(self.n_iter):
+            labels = self._assign(active_embedded)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, labels, active_embedded)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty clusters keep their previous centroid
+            filled = norms.ravel() > 0
+            self.centroids[filled] = sums[filled] / norms[filled]
+
+        order = np.argsort(labels, kind='stable')
+        self.list_items = active_ids[order]
+        self.list_offsets = np.concatenate(
+            ([0], np.cumsum(np.bincount(labels, minlength=len(self.centroids))))
+        ).astype(np.int64)
+
+    def candidates(self, row):
+        scores = self.centroids @ self.embedded[row]
+        n_probe = min(self.n_probe, len(scores))
+        probe = np.argpartition(-scores, n_probe - 1)[:n_probe]
+        return np.concatenate([
+            self.list_items[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe
+        ])
+
+    def memory_bytes(self):
+        return _nbytes(self.vectors, self.embedded, self.centroids,
+                       self.list_items, self.list_offsets)
+
+
+ENGINES = {
+    BruteForceEngine.name: BruteForceEngine,
+    LSHEngine.name: LSHEngine,
+    IVFEngine.name: IVFEngine
+}
+
+
+def create_engine(backend='brute', **options):
+    """Instantiate a similarity engine by name"""
+    try:
+        engine_class = ENGINES[backend]
+    except KeyError:
+        raise ValueError(f"Unknown ANN backend '{backend}', expected one of {sorted(ENGINES)}")
+    return engine_class(**options)
@@ -1,16 +1,37 @@
-from flask import Flask, render_template, request, session, redirect, url_for, jsonify
+from flask import Flask, Response, abort, g, render_template, request, session, redirect, url_for, jsonify, send_file
 import json
 import os
+import time
 import pandas as pd
+import metrics
+from profiling import HEADER as PROFILE_HEADER, Profiler
 from recommender import MovieRecommender
+from serving import ModelServer
+
+try:
+    from config import MAX_BATCH_USERS, MAX_RECOMMENDATION_COUNT, POPULAR_FALLBACK_PATH, POPULAR_FALLBACK_SIZE
+    from config import PROFILE_SAMPLE_RATE, PROFILE_SECRET, PROFILE_DIR, PROFILE_KEEP, PROFILE_ENDPOINTS
+except ImportError:
+    MAX_BATCH_USERS = 10000
+    MAX_RECOMMENDATION_COUNT = 100
+    POPULAR_FALLBACK_PATH = "data/popular_fallback.json"
+    POPULAR_FALLBACK_SIZE = 50
+    PROFILE_SAMPLE_RATE = os.environ.get('MOVIE_PROFILE') or 0
+    PROFILE_SECRET = os.environ.get('MOVIE_PROFILE_SECRET')
+    PROFILE_DIR = "data/profiles"
+    PROFILE_KEEP = 50
+    PROFILE_ENDPOINTS = ['results', 'api_recommend', 'api_recommend_batch']
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-change-in-production-12345'
 
-# Initialize recommender
-print("Initializing Movie Recommender...")
-recommender = MovieRecommender()
-print("Recommender initialized successfully!")
+# The recommender loads in the background; until it is ready, pages are
+# served from the popular movies saved by the previous run
+print("Initializing Movie Recommender in the background...")
+model = ModelServer(MovieRecommender, POPULAR_FALLBACK_PATH, POPULAR_FALLBACK_SIZE)
+model.start()
+
+profiler = Profiler(PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_SECRET, PROFILE_KEEP, PROFILE_ENDPOINTS)
 
 # Available genres
 AVAILABLE_GENRES = [
@@ -29,6 +50,36 @@ GENRE_EMOJIS = {
 }
 
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.profile = profiler.start(request.endpoint, request.path, request.headers.get(PROFILE_HEADER))
+
+
+@app.after_request
+def record_request(response):
+    endpoint = request.endpoint or 'unknown'
+    g.status = response.status_code
+    if endpoint != 'metrics_endpoint':
+        metrics.HTTP_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+        if metrics.enabled() and 'request_start' in g:
+            metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    return response
+
+
+@app.teardown_request
+def finish_profile(exc):
+    # Teardown also runs when the view raised, so the capture is always closed
+    capture = g.pop('profile', None)
+    if capture is not None:
+        profiler.finish(capture, {
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': g.get('status', 500)
+        })
+
+
 @app.route('/')
 def index():
     """Landing page"""
@@ -69,7 +120,7 @@ def step2_ratings():
                 seed_ratings[movie_id] = int(value)
         
         if len(seed_ratings) < 3:
-            movies = recommender.get_popular_movies_for_seeding(10)
+            movies = model.popular_movies(10)
             return render_template('step2_ratings.html', 
                                  movies=movies.to_dict('records'),
                                  error="Please rate at least 3 movies!")
@@ -78,7 +129,7 @@ def step2_ratings():
         print(f"✓ User rated {len(seed_ratings)} movies")
         return redirect(url_for('step3_context'))
     
-    movies = recommender.get_popular_movies_for_seeding(10)
+    movies = model.popular_movies(10)
     return render_template('step2_ratings.html', 
                          movies=movies.to_dict('records'))
 
@@ -111,43 +162,26 @@ def results():
     if not user_input['genres'] or not user_input['seed_ratings']:
         return redirect(url_for('index'))
     
-    print("\n" + "="*70)
-    print("GENERATING RECOMMENDATIONS")
-    print("="*70)
-    print(f"Genres: {user_input['genres']}")
-    print(f"Seed Ratings: {len(user_input['seed_ratings'])} movies rated")
-    print(f"Mood: {user_input['mood']}")
-    print(f"Occasion: {user_input['occasion']}")
-    print(f"Time Budget: {user_input['time_budget']}")
+    # Get recommendations (stage timings and fallbacks are on /metrics)
+    recommendations = model.recommend(user_input, n=10)
     
-    # Get recommendations
-    recommendations = recommender.get_recommendations(user_input, n=10)
+    # Fetch movie details from API (OMDb, TMDB, or None), all movies at once
+    details = model.fetch_details(
+        recommendations['title'].tolist(), recommendations['movieId'].tolist()
+    )
     
-    print(f"✓ Generated {len(recommendations)} recommendations")
-    
-    # Fetch movie details from API (OMDb, TMDB, or None)
     movie_list = []
-    for _, movie in recommendations.iterrows():
+    for (_, movie), api_details in zip(recommendations.iterrows(), details):
         movie_dict = movie.to_dict()
         
-        # Use the unified fetch method (automatically picks OMDb/TMDB/None)
-        api_details = recommender.fetch_movie_details(movie['title'])
-        
         if api_details:
             movie_dict.update(api_details)
-            print(f"  ✓ Fetched details for: {movie['title']}")
-        else:
+        elif 'overview' not in movie_dict or pd.isna(movie_dict['overview']):
             # Use local data if API not available
-            if 'overview' in movie_dict and pd.notna(movie_dict['overview']):
-                print(f"  ℹ Using local data for: {movie['title']}")
-            else:
-                movie_dict['overview'] = 'No description available.'
-                print(f"  ⚠ No details for: {movie['title']}")
+            movie_dict['overview'] = 'No description available.'
         
         movie_list.append(movie_dict)
     
-    print("="*70 + "\n")
-    
     return render_template('results.html', 
                          movies=movie_list,
                          user_prefs=user_input)
@@ -162,13 +196,66 @@ def api_recommend():
         if 'seed_ratings' in data:
             data['seed_ratings'] = {int(k): v for k, v in data['seed_ratings'].items()}
         
-        recommendations = recommender.get_recommendations(data, n=10)
+        recommendations = model.recommend(data, n=10)
         result = recommendations.to_dict('records')
         
         return jsonify({
             'success': True,
             'count': len(result),
-            'recommendations': result
+            'recommendations': result,
+            'fallback': not model.ready
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+
+@app.route('/api/recommend/batch', methods=['POST'])
+def api_recommend_batch():
+    """API endpoint for recommendations for many users in one request"""
+    try:
+        data = request.get_json()
+        users = data.get('users', [])
+        n = int(data.get('n', 10))
+        
+        if len(users) > MAX_BATCH_USERS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {MAX_BATCH_USERS} users per batch'
+            }), 400
+        
+        if not 1 <= n <= MAX_RECOMMENDATION_COUNT:
+            return jsonify({
+                'success': False,
+                'error': f'n must be between 1 and {MAX_RECOMMENDATION_COUNT}'
+            }), 400
+        
+        for user in users:
+            if 'seed_ratings' in user:
+                user['seed_ratings'] = {int(k): v for k, v in user['seed_ratings'].items()}
+        
+        start_time = time.time()
+        batch = model.recommend_batch(users, n=n)
+        elapsed = time.time() - start_time
+        users_per_sec = len(users) / elapsed if elapsed > 0 else 0.0
+        
+        results = []
+        for user, recommendations in zip(users, batch):
+            result = {'recommendations': recommendations.to_dict('records')}
+            if 'user_id' in user:
+                result['user_id'] = user['user_id']
+            results.append(result)
+        
+        return jsonify({
+            'success': True,
+            'count': len(results),
+            'results': results,
+            'elapsed_ms': elapsed * 1000,
+            'users_per_sec': users_per_sec,
+            'fallback': not model.ready
         })
     
     except Exception as e:
@@ -178,11 +265,51 @@ def api_recommend():
         }), 400
 
 
+@app.route('/api/ratings', methods=['POST'])
+def api_add_ratings():
+    """API endpoint to add ratings to the live model (this worker's copy; all workers on restart)"""
+    if not model.ready:
+        return jsonify({
+            'success': False,
+            'error': f'Model is {model.state}, ratings cannot be added yet'
+        }), 503
+    
+    try:
+        data = request.get_json()
+        ratings = data.get('ratings', [])
+        
+        user_ids = [int(r['userId']) for r in ratings]
+        movie_ids = [int(r['movieId']) for r in ratings]
+        values = [float(r['rating']) for r in ratings]
+        if any(not 0.5 <= v <= 5.0 for v in values):
+            return jsonify({
+                'success': False,
+                'error': 'Ratings must be between 0.5 and 5.0'
+            }), 400
+        
+        summary = model.recommender.add_ratings(user_ids, movie_ids, values)
+        
+        return jsonify({'success': True, **summary})
+    
+    except OSError as e:
+        # Not written to the ratings log, so not applied either
+        return jsonify({
+            'success': False,
+            'error': f'Ratings could not be saved: {e}'
+        }), 500
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+
 @app.route('/api/movies/popular')
 def api_popular_movies():
     """API endpoint to get popular movies"""
     try:
-        movies = recommender.get_popular_movies_for_seeding(10)
+        movies = model.popular_movies(10)
         return jsonify({
             'success': True,
             'movies': movies.to_dict('records')
@@ -196,13 +323,66 @@ def api_popular_movies():
 
 @app.route('/health')
 def health_check():
-    """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'movies_loaded': len(recommender.movies),
-        'ratings_loaded': len(recommender.ratings),
-        'api_configured': 'Yes' if hasattr(recommender, 'fetch_movie_details') else 'No'
-    })
+    """Health check endpoint: load state, plus model stats once ready"""
+    report = {'status': 'healthy' if model.ready else model.state, **model.status()}
+    if model.ready:
+        recommender = model.recommender
+        report.update({
+            'movies_loaded': len(recommender.movies),
+            'ratings_loaded': recommender.n_ratings,
+            'api_configured': 'Yes' if hasattr(recommender, 'fetch_movie_details') else 'No',
+            'result_cache': recommender.result_cache.stats(),
+            'catalog_memory': recommender.movies.memory_usage()
+        })
+    return jsonify(report)
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Counters and latency histograms in the Prometheus text format"""
+    for state in ('loading', 'ready', 'degraded'):
+        metrics.MODEL_STATE.set(1 if model.state == state else 0, state=state)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def require_profiler():
+    """404 unless profiling is on with a secret; the request must be signed with it"""
+    # Without a secret there is no way to tell who is asking, so captures stay on disk only
+    if not profiler.enabled or not profiler.secret:
+        abort(404)
+    if not profiler.authorized(request.path, request.headers.get(PROFILE_HEADER)):
+        abort(403)
+
+
+@app.route('/debug/profiles')
+def profile_index():
+    """Captured request profiles, newest first"""
+    require_profiler()
+    return jsonify({'directory': profiler.directory, 'profiles': profiler.index()})
+
+
+@app.route('/debug/profiles/<capture_id>')
+def profile_report(capture_id):
+    """One capture: top functions and allocations, or the raw .prof file with ?format=prof"""
+    require_profiler()
+    record = profiler.load(capture_id)
+    if record is None:
+        abort(404)
+    if request.args.get('format') == 'prof':
+        return send_file(os.path.abspath(profiler.path(capture_id, '.prof')), as_attachment=True)
+    return jsonify(record)
+
+
+@app.route('/health/live')
+def liveness_check():
+    """Liveness probe: the process is up and answering"""
+    return jsonify({'status': 'alive'})
+
+
+@app.route('/health/ready')
+def readiness_check():
+    """Readiness probe: 200 once the model serves, 503 while loading or degraded"""
+    return jsonify(model.status()), 200 if model.ready else 503
 
 
 @app.errorhandler(404)
@@ -219,8 +399,7 @@ if __name__ == '__main__':
     print("\n" + "="*70)
     print("🎬 MOVIE RECOMMENDATION SYSTEM")
     print("="*70)
-    print(f"✓ Loaded {len(recommender.movies)} movies")
-    print(f"✓ Loaded {len(recommender.ratings)} ratings")
+    print(f"✓ Model {model.state} (phase: {model.phase}), {len(model.fallback)} fallback movies")
     print(f"✓ Available genres: {len(AVAILABLE_GENRES)}")
     
     # Check which API is configured
@@ -239,7 +418,13 @@ if __name__ == '__main__':
     print("\n🌐 Starting Flask server...")
     print("📍 Main App: http://localhost:5000")
     print("📍 API: http://localhost:5000/api/recommend")
-    print("📍 Health: http://localhost:5000/health")
+    print("📍 Health: http://localhost:5000/health (probes: /health/live, /health/ready)")
+    print("📍 Metrics: http://localhost:5000/metrics")
+    if profiler.enabled and profiler.secret:
+        print(f"📍 Profiles: http://localhost:5000/debug/profiles (sample rate {profiler.sample_rate:g})")
+    elif profiler.enabled:
+        print(f"📍 Profiles: {profiler.directory} (sample rate {profiler.sample_rate:g}; "
+              f"set MOVIE_PROFILE_SECRET to serve them)")
     print("\n💡 Quick Setup:")
     print("   1. Get FREE OMDb API key (takes 1 minute)")
     print("   2. Update OMDB_API_KEY in recommender.py")
@@ -0,0 +1,159 @@
+"""
+Recall and latency benchmark for the item-similarity engines in ann.py.
+
+Brute-force top-10 neighbors of a sample of rated movies are the ground
+truth. Every engine configuration reports recall@10, per-query latency,
+fit time and index memory, so ANN_BACKEND/ANN_OPTIONS can be chosen for
+the catalog at hand.
+
+    python -m benchmarks.ann_recall [--queries 500] [--engine lsh:n_tables=16,n_bits=8]
+    python -m benchmarks.ann_recall --synthetic 20000 --json ann.json
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from ann import create_engine
+
+DEFAULT_ENGINES = [
+    'brute',
+    'lsh:n_tables=8,n_bits=10',
+    'lsh:n_tables=16,n_bits=8',
+    'ivf:n_probe=4',
+    'ivf:n_probe=8',
+    'ivf:n_probe=16',
+]
+
+
+def parse_engine(spec):
+    """'lsh:n_tables=8,n_bits=12' -> ('lsh', {'n_tables': 8, 'n_bits': 12})"""
+    backend, _, params = spec.partition(':')
+    options = {}
+    for item in filter(None, params.split(',')):
+        key, _, value = item.partition('=')
+        try:
+            options[key] = int(value)
+        except ValueError:
+            options[key] = float(value)
+    return backend, options
+
+
+def synthetic_matrix(n_items, n_users=None, n_groups=50, density=0.002, seed=0):
+    """Random item-user ratings with taste groups and popularity skew"""
+    rng = np.random.default_rng(seed)
+    n_users = n_users or n_items * 2
+    nnz = int(n_items * n_users * density)
+    item_groups = rng.integers(0, n_groups, n_items)
+    user_groups = rng.integers(0, n_groups, n_users)
+    group_items = [np.flatnonzero(item_groups == g) for g in range(n_groups)]
+
+    # Most ratings go to popular items of the user's own group
+    users = rng.integers(0, n_users, nnz)
+    items = (rng.zipf(1.3, nnz) - 1) % n_items
+    in_group = rng.random(nnz) < 0.8
+    for group in range(n_groups):
+        members = group_items[group]
+        picks = in_group & (user_groups[users] == group)
+        if len(members) and picks.any():
+            items[picks] = members[(rng.zipf(1.3, picks.sum()) - 1) % len(members)]
+
+    ratings = rng.integers(1, 11, nnz).astype(np.float32) / 2
+    matrix = sp.csr_matrix((ratings, (items, users)), shape=(n_items, n_users))
+    matrix.sum_duplicates()
+    return matrix
+
+
+def load_item_matrix(movies_csv, ratings_csv):
+    from recommender import MovieRecommender
+    # The dataset ratings only: no saved index, snapshot or runtime ratings
+    recommender = MovieRecommender(movies_csv, ratings_csv, neighbor_index_path=None,
+                                   snapshot_path=None, ratings_log_path=None)
+    return recommender.item_user_matrix
+
+
+def recall_at_k(found, truth):
+    """Mean fraction of each query's true neighbors that were found"""
+    recalls = []
+    for found_row, truth_row in zip(found, truth):
+        truth_set = set(truth_row[truth_row >= 0].tolist())
+        if truth_set:
+            recalls.append(len(truth_set & set(found_row.tolist())) / len(truth_set))
+    return float(np.mean(recalls)) if recalls else 0.0
+
+
+def run(item_matrix, engines, n_queries, k, seed=0):
+    rng = np.random.default_rng(seed)
+    rated = np.flatnonzero(np.diff(sp.csr_matrix(item_matrix).indptr) > 0)
+    queries = rng.choice(rated, min(n_queries, len(rated)), replace=False)
+
+    truth, _ = create_engine('brute').fit(item_matrix).query(queries, k)
+
+    results = []
+    for spec in engines:
+        backend, options = parse_engine(spec)
+        start_time = time.perf_counter()
+        engine = create_engine(backend, **options).fit(item_matrix)
+        fit_seconds = time.perf_counter() - start_time
+
+        latencies = []
+        found = np.empty((len(queries), k), dtype=np.int32)
+        for i, row in enumerate(queries):
+            start_time = time.perf_counter()
+            ids, _ = engine.query([row], k)
+            latencies.append(time.perf_counter() - start_time)
+            found[i] = ids[0]
+
+        latencies_ms = np.array(latencies) * 1000
+        results.append({
+            'engine': spec,
+            'recall_at_k': recall_at_k(found, truth),
+            'latency_ms_mean': float(latencies_ms.mean()),
+            'latency_ms_p50': float(np.percentile(latencies_ms, 50)),
+            'latency_ms_p95': float(np.percentile(latencies_ms, 95)),
+            'fit_seconds': fit_seconds,
+            'index_mb': engine.memory_bytes() / (1024 * 1024)
+        })
+    return results
+
+
+def main():
+    from config import MOVIES_DATASET_PATH, RATINGS_DATASET_PATH
+
+    parser = argparse.ArgumentParser(description='Benchmark item-similarity engines')
+    parser.add_argument('--movies', default=MOVIES_DATASET_PATH)
+    parser.add_argument('--ratings', default=RATINGS_DATASET_PATH)
+    parser.add_argument('--synthetic', type=int, metavar='ITEMS',
+                        help='use a random matrix with this many items instead of the dataset')
+    parser.add_argument('--engine', action='append', dest='engines',
+                        help='engine spec, e.g. ivf:n_probe=8 (repeatable)')
+    parser.add_argument('--queries', type=int, default=500, help='sampled query movies')
+    parser.add_argument('--k', type=int, default=10, help='neighbors per query (recall@k)')
+    parser.add_argument('--json', help='also write results to this file')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        item_matrix = synthetic_matrix(args.synthetic)
+    else:
+        item_matrix = load_item_matrix(args.movies, args.ratings)
+    print(f"Items: {item_matrix.shape[0]:,}  Users: {item_matrix.shape[1]:,}  Ratings: {item_matrix.nnz:,}")
+
+    results = run(item_matrix, args.engines or DEFAULT_ENGINES, args.queries, args.k)
+
+    print(f"\n{'engine':<28}{'recall@' + str(args.k):>10}{'mean ms':>10}{'p95 ms':>10}"
+          f"{'fit s':>8}{'index MB':>10}")
+    for row in results:
+        print(f"{row['engine']:<28}{row['recall_at_k']:>10.3f}{row['latency_ms_mean']:>10.2f}"
+              f"{row['latency_ms_p95']:>10.2f}{row['fit_seconds']:>8.1f}{row['index_mb']:>10.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'k': args.k, 'queries': args.queries, 'results': results}, f, indent=2)
+        print(f"\n✓ Wrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
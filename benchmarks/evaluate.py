@@ -0,0 +1,278 @@
+"""
+Offline evaluation and latency benchmark for the hybrid recommender.
+
+A sample of users has part of its ratings held out (at random, or the most
+recent ones when the ratings file has timestamps). The collaborative model
+is retrained without the held-out ratings, then every test user is replayed
+through content_based_score, collaborative_score and get_recommendations
+with their remaining ratings as seeds and their favourite genres as
+preferences. Held-out ratings >= --relevant count as hits.
+
+Reports precision/recall/NDCG@k per ranker, p50/p95/p99 latency per stage,
+model build time and peak RSS. Without the MovieLens files the built-in
+dummy data set is used.
+
+    python -m benchmarks.evaluate [--users 500] [--split temporal] [--json eval.json]
+"""
+
+import argparse
+import json
+import platform
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from ingest import peak_memory_mb
+from recommender import MovieRecommender
+
+STAGES = ['content', 'collaborative', 'hybrid']
+
+
+def sample_users(user_item_matrix, n_users, min_ratings, rng):
+    """Rows of users with at least min_ratings ratings"""
+    counts = np.diff(user_item_matrix.indptr)
+    eligible = np.flatnonzero(counts >= min_ratings)
+    return np.sort(rng.choice(eligible, min(n_users, len(eligible)), replace=False))
+
+
+def load_timestamps(ratings_csv, user_ids, chunksize=1_000_000):
+    """{userId: {movieId: timestamp}} for the given users, or None without timestamps"""
+    try:
+        header = pd.read_csv(ratings_csv, nrows=0).columns
+    except (OSError, ValueError):
+        return None
+    if 'timestamp' not in header:
+        return None
+
+    wanted = set(int(u) for u in user_ids)
+    timestamps = {}
+    reader = pd.read_csv(ratings_csv, usecols=['userId', 'movieId', 'timestamp'], chunksize=chunksize)
+    for chunk in reader:
+        chunk = chunk[chunk['userId'].isin(wanted)]
+        for user_id, movie_id, timestamp in chunk.itertuples(index=False):
+            timestamps.setdefault(int(user_id), {})[int(movie_id)] = int(timestamp)
+    return timestamps
+
+
+def holdout_split(recommender, rows, fraction, split, ratings_csv, rng):
+    """
+    Remove held-out ratings of the test users from the training matrix.
+
+    Returns (train_matrix, {row: (seed_cols, seed_ratings, test_cols, test_ratings)}).
+    """
+    matrix = recommender.user_item_matrix
+    timestamps = None
+    if split == 'temporal':
+        timestamps = load_timestamps(ratings_csv, recommender.user_ids[rows])
+        if timestamps is None:
+            print("⚠ Ratings have no timestamps, falling back to a random split")
+
+    keep = np.ones(matrix.nnz, dtype=bool)
+    cases = {}
+    for row in rows:
+        start, stop = matrix.indptr[row], matrix.indptr[row + 1]
+        cols = matrix.indices[start:stop]
+        if timestamps is not None:
+            user_times = timestamps.get(int(recommender.user_ids[row]), {})
+            times = np.array([user_times.get(int(m), 0) for m in recommender.movie_ids[cols]])
+            order = np.argsort(times, kind='stable')
+        else:
+            order = rng.permutation(len(cols))
+        n_test = max(1, int(round(len(cols) * fraction)))
+        seed_pos, test_pos = order[:-n_test], order[-n_test:]
+        keep[start + test_pos] = False
+        cases[row] = (
+            cols[seed_pos], matrix.data[start + seed_pos],
+            cols[test_pos], matrix.data[start + test_pos]
+        )
+
+    coo = matrix.tocoo()
+    train = sp.csr_matrix(
+        (coo.data[keep], (coo.row[keep], coo.col[keep])), shape=matrix.shape, dtype=np.float32
+    )
+    return train, cases
+
+
+def favourite_genres(recommender, cols, ratings, n=2):
+    """Most frequent genres among a user's best-rated seed movies"""
+    if len(cols) == 0:
+        return []
+    liked = cols[ratings >= np.median(ratings)]
+    counts = Counter()
+    for genres in recommender.movies.column('genres', liked):
+        counts.update(g for g in str(genres).split('|') if g and g != '(no genres listed)')
+    return [genre for genre, _ in counts.most_common(n)]
+
+
+def top_columns(scores, exclude, k):
+    """Columns of the k best positive scores, skipping excluded columns"""
+    scores = np.array(scores, dtype=np.float64)
+    scores[exclude] = -np.inf
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return top[scores[top] > 0]
+
+
+def ranking_metrics(ranked, relevant, k):
+    """precision@k, recall@k and binary NDCG@k for one ranked list"""
+    hits = np.array([col in relevant for col in ranked[:k]], dtype=np.float64)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    ideal = discounts[:min(len(relevant), k)].sum()
+    return {
+        'precision': hits.sum() / k,
+        'recall': hits.sum() / len(relevant),
+        'ndcg': float((hits * discounts[:len(hits)]).sum() / ideal)
+    }
+
+
+def latency_summary(seconds):
+    latencies_ms = np.array(seconds) * 1000
+    return {
+        'mean_ms': float(latencies_ms.mean()),
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95)),
+        'p99_ms': float(np.percentile(latencies_ms, 99))
+    }
+
+
+def replay(recommender, cases, k, relevant_threshold):
+    """Score every test user with each ranker, timing each stage"""
+    metrics = {stage: [] for stage in STAGES}
+    latencies = {stage: [] for stage in STAGES}
+
+    for seed_cols, seed_values, test_cols, test_values in cases.values():
+        relevant = set(test_cols[test_values >= relevant_threshold].tolist())
+        if not relevant:
+            continue
+        seed_ratings = {int(recommender.movie_ids[c]): float(r) for c, r in zip(seed_cols, seed_values)}
+        user_input = {
+            'genres': favourite_genres(recommender, seed_cols, seed_values),
+            'mood': '',
+            'seed_ratings': seed_ratings,
+            'occasion': '',
+            'time_budget': ''
+        }
+
+        start_time = time.perf_counter()
+        content_scores = recommender.content_based_score(user_input)
+        latencies['content'].append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        collab_scores = recommender.collaborative_score(seed_ratings)
+        latencies['collaborative'].append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        recommendations = recommender.get_recommendations(user_input, n=k)
+        latencies['hybrid'].append(time.perf_counter() - start_time)
+
+        hybrid_cols = recommender.movie_columns(recommendations['movieId'].to_numpy())
+        rankings = {
+            'content': top_columns(content_scores, seed_cols, k),
+            'collaborative': top_columns(collab_scores, seed_cols, k),
+            'hybrid': hybrid_cols[hybrid_cols >= 0]
+        }
+        for stage, ranked in rankings.items():
+            metrics[stage].append(ranking_metrics(ranked, relevant, k))
+
+    results = {}
+    for stage in STAGES:
+        rows = metrics[stage]
+        results[stage] = {
+            f'{name}_at_{k}': float(np.mean([row[name] for row in rows])) if rows else 0.0
+            for name in ('precision', 'recall', 'ndcg')
+        }
+        results[stage]['latency'] = latency_summary(latencies[stage]) if latencies[stage] else {}
+    return results, len(metrics['hybrid'])
+
+
+def run(movies_csv, ratings_csv, n_users=500, fraction=0.2, split='random', k=10,
+        min_ratings=5, relevant_threshold=4.0, seed=0):
+    rng = np.random.default_rng(seed)
+
+    start_time = time.perf_counter()
+    recommender = MovieRecommender(movies_csv, ratings_csv, neighbor_index_path=None, snapshot_path=None,
+                                   ratings_log_path=None)
+    build_seconds = time.perf_counter() - start_time
+
+    rows = sample_users(recommender.user_item_matrix, n_users, min_ratings, rng)
+    train, cases = holdout_split(recommender, rows, fraction, split, ratings_csv, rng)
+
+    # Retrain everything that learns from ratings on the training split only
+    start_time = time.perf_counter()
+    recommender.user_item_matrix = train
+    recommender.prepare_collaborative_model()
+    recommender.prepare_popularity()
+    recommender.result_cache.clear()
+    retrain_seconds = time.perf_counter() - start_time
+
+    stages, n_evaluated = replay(recommender, cases, k, relevant_threshold)
+    return {
+        'created': time.time(),
+        'python': platform.python_version(),
+        'dataset': {
+            'movies': len(recommender.movie_ids),
+            'users': int(recommender.user_item_matrix.shape[0]),
+            'ratings': int(recommender.user_item_matrix.nnz + sum(len(c[2]) for c in cases.values()))
+        },
+        'split': {
+            'method': split,
+            'holdout_fraction': fraction,
+            'test_users': len(cases),
+            'evaluated_users': n_evaluated,
+            'relevant_threshold': relevant_threshold,
+            'seed': seed
+        },
+        'k': k,
+        'build_seconds': build_seconds,
+        'retrain_seconds': retrain_seconds,
+        'peak_memory_mb': peak_memory_mb(),
+        'stages': stages
+    }
+
+
+def main():
+    from config import MOVIES_DATASET_PATH, RATINGS_DATASET_PATH
+
+    parser = argparse.ArgumentParser(description='Evaluate recommendation quality and latency')
+    parser.add_argument('--movies', default=MOVIES_DATASET_PATH)
+    parser.add_argument('--ratings', default=RATINGS_DATASET_PATH)
+    parser.add_argument('--users', type=int, default=500, help='sampled test users')
+    parser.add_argument('--holdout', type=float, default=0.2, help='fraction of each user\'s ratings held out')
+    parser.add_argument('--split', choices=['random', 'temporal'], default='random')
+    parser.add_argument('--k', type=int, default=10, help='list length for precision/recall/NDCG')
+    parser.add_argument('--min-ratings', type=int, default=5, help='minimum ratings for a test user')
+    parser.add_argument('--relevant', type=float, default=4.0, help='held-out rating counted as a hit')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='also write results to this file')
+    args = parser.parse_args()
+
+    results = run(args.movies, args.ratings, args.users, args.holdout, args.split, args.k,
+                  args.min_ratings, args.relevant, args.seed)
+
+    dataset = results['dataset']
+    print(f"\nMovies: {dataset['movies']:,}  Users: {dataset['users']:,}  Ratings: {dataset['ratings']:,}")
+    print(f"Evaluated {results['split']['evaluated_users']:,} users ({args.split} split, "
+          f"{args.holdout:.0%} held out)")
+    print(f"\n{'stage':<16}{'P@' + str(args.k):>8}{'R@' + str(args.k):>8}{'NDCG':>8}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, row in results['stages'].items():
+        latency = row['latency']
+        print(f"{stage:<16}{row[f'precision_at_{args.k}']:>8.3f}{row[f'recall_at_{args.k}']:>8.3f}"
+              f"{row[f'ndcg_at_{args.k}']:>8.3f}{latency.get('p50_ms', 0):>10.2f}"
+              f"{latency.get('p95_ms', 0):>10.2f}{latency.get('p99_ms', 0):>10.2f}")
+    peak = results['peak_memory_mb']
+    peak_text = f", peak RSS {peak:,.0f} MB" if peak is not None else ""
+    print(f"\nBuild {results['build_seconds']:.1f}s, retrain {results['retrain_seconds']:.1f}s{peak_text}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Wrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Build the model snapshot outside the web process.
+
+Runs the same stages as MovieRecommender's in-process build, spread over a
+process pool, and writes the snapshot the app memory-maps at startup:
+
+1. catalog       movies CSV -> compact catalog (catalog.py)
+2. ingest        ratings CSV split into byte ranges parsed in parallel,
+                 while the genre TF-IDF is fitted on another worker
+3. ratings log   ratings accepted at runtime (RATINGS_LOG_PATH and its
+                 archive) merged into the rating matrices
+4. popularity    per-movie rating stats and the popularity ranking
+5. neighbors     top-K item neighbors, query blocks spread over the workers
+6. als           only with COLLABORATIVE_MODEL = 'als' (threaded, see mf.py)
+7. snapshot      written under the build lock, so starting app workers wait
+                 for it instead of building their own; the merged ratings
+                 are then moved out of the log
+8. fallback      the popular movies the app serves while a model loads
+
+    python build_model.py [--workers 8] [--movies ...] [--ratings ...] [--output ...]
+"""
+
+import argparse
+import os
+import time
+
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from catalog import Catalog
+from genre_index import GenreIndex
+from ingest import load_ratings_parallel
+from mf import ALSModel
+from neighbors import ItemNeighborIndex, process_context
+from serving import popular_fallback, write_fallback
+from recommender import (
+    ALS_FACTORS, ALS_ITERATIONS, ALS_REGULARIZATION, ANN_BACKEND, ANN_OPTIONS, COLLABORATIVE_MODEL,
+    CONTENT_CACHE_SIZE, MODEL_SNAPSHOT_PATH, NEIGHBOR_TOP_K, MovieRecommender, fit_genre_tfidf
+)
+
+try:
+    from config import MOVIES_DATASET_PATH, RATINGS_DATASET_PATH, POPULAR_FALLBACK_PATH, POPULAR_FALLBACK_SIZE
+except ImportError:
+    MOVIES_DATASET_PATH = "data/movies_dataset.csv"
+    RATINGS_DATASET_PATH = "data/ratings_dataset.csv"
+    POPULAR_FALLBACK_PATH = "data/popular_fallback.json"
+    POPULAR_FALLBACK_SIZE = 50
+
+
+class StageTimer:
+    """Prints each stage as it starts and finishes and keeps the timings"""
+
+    def __init__(self):
+        self.timings = []
+
+    def run(self, name, func, *args, **kwargs):
+        print(f"▶ {name}")
+        start_time = time.time()
+        result = func(*args, **kwargs)
+        elapsed = time.time() - start_time
+        self.timings.append((name, elapsed))
+        print(f"✓ {name} in {elapsed:.1f}s")
+        return result
+
+    def report(self):
+        total = sum(elapsed for _, elapsed in self.timings)
+        print("\nStage              Seconds   Share")
+        for name, elapsed in self.timings:
+            print(f"{name:<18} {elapsed:>7.1f}  {elapsed / max(total, 1e-9):>6.1%}")
+        print(f"{'total':<18} {total:>7.1f}")
+
+
+def build(movies_csv, ratings_csv, output, workers, chunk_size=256, parts=None,
+          fallback_path=POPULAR_FALLBACK_PATH):
+    """
+    Build the model with workers processes and save it as the snapshot at
+    output, and its popular movies as the fallback list at fallback_path
+    """
+    timer = StageTimer()
+    recommender = MovieRecommender(movies_csv, ratings_csv, neighbor_index_path=None,
+                                   snapshot_path=output, build=False)
+
+    def load_catalog():
+        recommender.movies = Catalog.from_frame(pd.read_csv(movies_csv))
+        recommender.index_movies()
+    timer.run('catalog', load_catalog)
+
+    with ProcessPoolExecutor(workers, mp_context=process_context()) as pool:
+        def ingest():
+            # The TF-IDF fit is independent of the ratings and runs alongside them
+            tfidf = pool.submit(fit_genre_tfidf, recommender.movies['genres'])
+            recommender.user_item_matrix, recommender.user_ids, recommender.ingest_stats = load_ratings_parallel(
+                ratings_csv, recommender.movie_pos, len(recommender.movie_ids), pool, parts or workers * 4
+            )
+            recommender.tfidf, recommender.tfidf_matrix = tfidf.result()
+            recommender.genre_index = GenreIndex(recommender.tfidf, recommender.tfidf_matrix, CONTENT_CACHE_SIZE)
+        timer.run('ingest + tfidf', ingest)
+
+    def ratings_log():
+        recommender.item_user_matrix = recommender.user_item_matrix.T.tocsr()
+        recommender.replay_ratings(refresh=False)
+        recommender.compact_ratings()
+    timer.run('ratings log', ratings_log)
+
+    def popularity():
+        recommender.prepare_popularity()
+        recommender.prepare_context_masks()
+    timer.run('popularity', popularity)
+
+    recommender.neighbor_index = timer.run(
+        'neighbors', ItemNeighborIndex.build, recommender.item_user_matrix, recommender.movie_ids,
+        k=NEIGHBOR_TOP_K, backend=ANN_BACKEND, options=ANN_OPTIONS,
+        chunk_size=chunk_size, verbose=True, workers=workers
+    )
+
+    recommender.mf_model = None
+    if COLLABORATIVE_MODEL == 'als':
+        def als():
+            model = ALSModel(factors=ALS_FACTORS, regularization=ALS_REGULARIZATION,
+                             iterations=ALS_ITERATIONS).fit(recommender.user_item_matrix)
+            model.user_factors = None
+            return model
+        recommender.mf_model = timer.run('als', als)
+
+    def save():
+        # Ratings logged while the build ran are applied before saving
+        if not recommender.fold_ratings(force=True):
+            raise SystemExit(1)
+    timer.run('snapshot', save)
+
+    if fallback_path:
+        timer.run('fallback', write_fallback, fallback_path,
+                  popular_fallback(recommender, POPULAR_FALLBACK_SIZE))
+
+    timer.report()
+    return recommender
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the model snapshot the app loads')
+    parser.add_argument('--movies', default=MOVIES_DATASET_PATH)
+    parser.add_argument('--ratings', default=RATINGS_DATASET_PATH)
+    parser.add_argument('--output', default=MODEL_SNAPSHOT_PATH, help='snapshot directory')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--chunk-size', type=int, default=256, help='movies per neighbor query block')
+    parser.add_argument('--parts', type=int, help='ratings byte ranges (default: 4 per worker)')
+    parser.add_argument('--fallback', default=POPULAR_FALLBACK_PATH, help='popular movies list for the app')
+    args = parser.parse_args()
+
+    for path in (args.movies, args.ratings):
+        if not os.path.exists(path):
+            parser.error(f'{path} not found')
+
+    print(f"Building model from {args.movies} and {args.ratings} with {args.workers} workers")
+    recommender = build(args.movies, args.ratings, args.output, args.workers, args.chunk_size, args.parts,
+                        args.fallback)
+    print(f"\n✓ {len(recommender.movies):,} movies, {recommender.n_ratings:,} ratings -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
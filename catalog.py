@@ -0,0 +1,204 @@
+"""
+Compact column store for the movie catalog.
+
+The catalog is read on every request but only ever shown N rows at a time,
+so instead of a DataFrame of Python objects every column is a flat NumPy
+array:
+
+- movieId and integer columns as int32, other numeric columns as float32
+- genres as a code into the distinct genre strings, plus a packed bitset
+  of the individual genres for masks
+- titles, overviews and any other text as (start, length) offsets into one
+  UTF-8 buffer in which identical strings are stored once
+
+Rows are turned back into records or a DataFrame only for the movies a
+response returns. The arrays save into and load from model snapshots, so
+worker processes share one memory-mapped copy of the catalog.
+"""
+
+import numpy as np
+import pandas as pd
+
+GENRE_SEPARATOR = '|'
+
+
+def _int_dtype(values):
+    """int32 when every value fits, else int64"""
+    info = np.iinfo(np.int32)
+    if len(values) == 0 or (values.min() >= info.min and values.max() <= info.max):
+        return np.int32
+    return np.int64
+
+
+def _float_values(array):
+    """float32 values as float64 with their shortest decimal form (4.7, not 4.69999980)"""
+    return np.asarray(array).astype(str).astype(np.float64)
+
+
+class Catalog:
+    """Catalog rows in row order, stored as typed arrays (see module docstring)"""
+
+    def __init__(self, arrays, layout):
+        self.arrays = arrays
+        self.layout = layout
+        self.genre_names = layout.get('genre_names', [])
+        self._genre_combos = np.asarray(layout.get('genre_combos', []), dtype=object)
+        self._genre_bit = {genre: i for i, genre in enumerate(self.genre_names)}
+
+    @classmethod
+    def from_frame(cls, frame):
+        arrays = {}
+        columns = []
+        genre_names, genre_combos = [], []
+        buffer = bytearray()
+        interned = {}
+
+        for name in frame.columns:
+            series = frame[name]
+            if name == 'genres':
+                columns.append([name, 'genres'])
+                genre_arrays, genre_names, genre_combos = cls._encode_genres(series)
+                arrays.update(genre_arrays)
+            elif pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+                columns.append([name, 'int'])
+                values = series.to_numpy(dtype=np.int64)
+                arrays[name] = values.astype(_int_dtype(values))
+            elif pd.api.types.is_numeric_dtype(series):
+                columns.append([name, 'float'])
+                arrays[name] = series.to_numpy(dtype=np.float32, na_value=np.nan)
+            else:
+                columns.append([name, 'text'])
+                starts = np.empty(len(series), dtype=np.int64)
+                lengths = np.empty(len(series), dtype=np.int32)
+                for row, value in enumerate(series.tolist()):
+                    if pd.isna(value):
+                        starts[row], lengths[row] = 0, -1
+                        continue
+                    value = str(value)
+                    span = interned.get(value)
+                    if span is None:
+                        encoded = value.encode('utf-8')
+                        span = interned[value] = (len(buffer), len(encoded))
+                        buffer.extend(encoded)
+                    starts[row], lengths[row] = span
+                arrays[f'{name}_start'] = starts
+                arrays[f'{name}_length'] = lengths
+
+        # Offsets only need 64 bits for a buffer past 2 GB
+        offset_dtype = np.int32 if len(buffer) < np.iinfo(np.int32).max else np.int64
+        for name, kind in columns:
+            if kind == 'text':
+                arrays[f'{name}_start'] = arrays[f'{name}_start'].astype(offset_dtype)
+        arrays['text'] = np.frombuffer(bytes(buffer), dtype=np.uint8)
+
+        layout = {
+            'rows': len(frame),
+            'columns': columns,
+            'genre_names': genre_names,
+            'genre_combos': genre_combos
+        }
+        return cls(arrays, layout)
+
+    @staticmethod
+    def _encode_genres(series):
+        present = series.notna().to_numpy()
+        codes, combos = pd.factorize(series, sort=False)
+        names = sorted({genre for combo in combos for genre in str(combo).split(GENRE_SEPARATOR) if genre})
+        bit = {genre: i for i, genre in enumerate(names)}
+
+        combo_hot = np.zeros((len(combos), max(len(names), 1)), dtype=bool)
+        for i, combo in enumerate(combos):
+            for genre in str(combo).split(GENRE_SEPARATOR):
+                if genre:
+                    combo_hot[i, bit[genre]] = True
+        combo_bits = np.packbits(combo_hot, axis=1)
+        bits = np.zeros((len(series), combo_bits.shape[1]), dtype=np.uint8)
+        bits[present] = combo_bits[codes[present]]
+
+        code_dtype = np.int16 if len(combos) < np.iinfo(np.int16).max else np.int32
+        arrays = {'genres_code': codes.astype(code_dtype), 'genres_bits': bits}
+        return arrays, names, [str(combo) for combo in combos]
+
+    @classmethod
+    def from_arrays(cls, prefix, arrays, layout):
+        """Catalog saved with to_arrays (arrays are used as given, e.g. memory-mapped)"""
+        start = len(prefix) + 1
+        return cls({name[start:]: array for name, array in arrays.items() if name.startswith(f'{prefix}_')}, layout)
+
+    def to_arrays(self, prefix):
+        """Named arrays for saving; the layout goes into the snapshot meta"""
+        return {f'{prefix}_{name}': array for name, array in self.arrays.items()}
+
+    def __len__(self):
+        return self.layout['rows']
+
+    @property
+    def columns(self):
+        return [name for name, _ in self.layout['columns']]
+
+    def kind(self, name):
+        for column, kind in self.layout['columns']:
+            if column == name:
+                return kind
+        raise KeyError(name)
+
+    def __getitem__(self, name):
+        """A whole column: the stored array for numbers, an object array for text and genres"""
+        return self.column(name)
+
+    def column(self, name, rows=None):
+        kind = self.kind(name)
+        if kind in ('int', 'float'):
+            values = self.arrays[name]
+            return values if rows is None else values[rows]
+        if kind == 'genres':
+            codes = self.arrays['genres_code'] if rows is None else self.arrays['genres_code'][rows]
+            values = np.empty(len(codes), dtype=object)
+            present = codes >= 0
+            values[present] = self._genre_combos[codes[present]]
+            return values
+        starts = self.arrays[f'{name}_start']
+        lengths = self.arrays[f'{name}_length']
+        if rows is not None:
+            starts, lengths = starts[rows], lengths[rows]
+        text = self.arrays['text']
+        values = np.empty(len(starts), dtype=object)
+        for i, (start, length) in enumerate(zip(starts.tolist(), lengths.tolist())):
+            if length >= 0:
+                values[i] = bytes(text[start:start + length]).decode('utf-8')
+        return values
+
+    def genre_mask(self, genres):
+        """Boolean mask of movies having any of the given genres"""
+        if 'genres_bits' not in self.arrays:
+            return np.zeros(len(self), dtype=bool)
+        wanted = np.zeros(self.arrays['genres_bits'].shape[1] * 8, dtype=bool)
+        for genre in genres:
+            if genre in self._genre_bit:
+                wanted[self._genre_bit[genre]] = True
+        if not wanted.any():
+            return np.zeros(len(self), dtype=bool)
+        return (self.arrays['genres_bits'] & np.packbits(wanted)).any(axis=1)
+
+    def frame(self, rows):
+        """DataFrame of the given rows (indexed by row), materialized from the arrays"""
+        rows = np.asarray(rows, dtype=np.int64)
+        data = {}
+        for name, kind in self.layout['columns']:
+            values = self.column(name, rows)
+            data[name] = _float_values(values) if kind == 'float' else values
+        return pd.DataFrame(data, index=rows)
+
+    def records(self, rows):
+        """List of {column: value} dicts for the given rows"""
+        return self.frame(rows).to_dict('records')
+
+    def memory_usage(self):
+        """Bytes held per array (memory-mapped arrays are shared between workers)"""
+        arrays = {name: int(array.nbytes) for name, array in self.arrays.items()}
+        return {
+            'movies': len(self),
+            'total_bytes': sum(arrays.values()),
+            'arrays': arrays,
+            'memory_mapped': any(isinstance(array, np.memmap) for array in self.arrays.values())
+        }
@@ -22,6 +22,19 @@ TMDB_BASE_URL = "https://api.themoviedb.org/3"
 # OPTION 3: Offline Mode (No posters)
 USE_NO_API = False
 
+# Detail lookups for a results page run concurrently over one keep-alive session
+API_TIMEOUT = 5            # Seconds per API request
+API_MAX_WORKERS = 10       # Concurrent lookups (and pooled connections)
+API_PAGE_DEADLINE = 3.0    # Seconds before a page falls back to local data
+
+# Details are cached per movieId in SQLite; links.csv maps movieIds to
+# imdbId/tmdbId so lookups fetch by ID instead of searching by title
+LINKS_PATH = "data/links.csv"
+METADATA_CACHE_PATH = "data/metadata_cache.sqlite3"  # None disables the cache
+METADATA_TTL = 30 * 86400          # Seconds before found details are refetched
+METADATA_NEGATIVE_TTL = 86400      # Seconds before a "not found" is retried
+METADATA_MEMORY_SIZE = 4096        # Entries kept in the in-process LRU
+
 # ==========================
 # 2. FLASK SETTINGS
 # ==========================
@@ -37,10 +50,61 @@ FLASK_PORT = 5000
 CONTENT_WEIGHT = 0.7       # 70% based on Genres/Mood
 COLLABORATIVE_WEIGHT = 0.3 # 30% based on User Ratings
 
+# Item-similarity engine used to build the neighbor index (see ann.py):
+# 'brute' (exact), 'lsh' or 'ivf'. Compare them with benchmarks/ann_recall.py
+ANN_BACKEND = 'brute'
+ANN_OPTIONS = {}           # e.g. {'n_tables': 16, 'n_bits': 8} or {'n_probe': 8}
+
+# Collaborative model: 'knn' (item-item neighbors), 'als' (matrix factorization,
+# see mf.py) or 'user' (user-user neighbors of the session, see userknn.py)
+COLLABORATIVE_MODEL = 'knn'
+ALS_FACTORS = 64
+ALS_REGULARIZATION = 10.0
+ALS_ITERATIONS = 10
+USER_NEIGHBORS = 50           # Most similar users whose ratings are blended
+USER_MAX_CANDIDATES = 20000   # Raters of the seeds compared per request (bounds latency)
+
+# Item-item neighbors (precomputed offline, see neighbors.py)
+COLLABORATIVE_NEIGHBORS = 10  # Neighbors used per seed movie
+NEIGHBOR_TOP_K = 50           # Neighbors stored per movie in the index
+NEIGHBOR_INDEX_PATH = "data/item_neighbors"
+
+# Content scores are memoized per genre+mood combination
+CONTENT_CACHE_SIZE = 256
+
 # Logic Constraints
 MIN_SEED_RATINGS = 3       # User must rate 3 movies
 MIN_GENRE_SELECTION = 1    # User must pick 1 genre
 DEFAULT_RECOMMENDATION_COUNT = 10
+BATCH_CHUNK_SIZE = 32      # Users scored together by /api/recommend/batch
+MAX_BATCH_USERS = 10000    # Largest batch accepted per request
+MAX_RECOMMENDATION_COUNT = 100  # Largest n accepted per user by /api/recommend/batch
+
+# Cache of ranked lists per canonical user input (see result_cache.py)
+RESULT_CACHE_SIZE = 1024           # Entries kept per worker
+RESULT_CACHE_TTL = 600             # Seconds an entry is served
+RESULT_CACHE_SHARED_PATH = None    # e.g. "data/result_cache.sqlite3" to share hits between workers
+
+# Per-stage latency histograms on /metrics (counters are always kept)
+METRICS_ENABLED = True
+
+# Opt-in request profiling (see profiling.py): MOVIE_PROFILE=1 profiles every
+# request, a fraction like 0.01 a sample of them (anything else is ignored with
+# a warning). With MOVIE_PROFILE_SECRET set, requests with a signed X-Profile
+# header are always profiled; /debug/profiles is only served with a secret
+PROFILE_SAMPLE_RATE = os.environ.get('MOVIE_PROFILE') or 0
+PROFILE_SECRET = os.environ.get('MOVIE_PROFILE_SECRET')
+PROFILE_DIR = "data/profiles"
+PROFILE_KEEP = 50                  # Newest captures kept on disk
+PROFILE_ENDPOINTS = ['results', 'api_recommend', 'api_recommend_batch']
+
+# Ratings posted to /api/ratings are buffered and merged into the sparse
+# matrices once this many are pending
+RATINGS_COMPACT_THRESHOLD = 100000
+# ...and appended here first. Each compaction folds the logged ratings into
+# a new snapshot; a start replays only what was logged after its snapshot.
+# A worker applies only the ratings it accepted itself until it restarts
+RATINGS_LOG_PATH = "data/ratings_log.csv"
 
 # ==========================
 # 4. DATA CONFIGURATION
@@ -48,6 +112,19 @@ DEFAULT_RECOMMENDATION_COUNT = 10
 MOVIES_DATASET_PATH = "data/movies_dataset.csv"
 RATINGS_DATASET_PATH = "data/ratings_dataset.csv"
 
+# Fitted model snapshot, rebuilt only when the data files' MD5s change.
+# Workers memory-map it read-only and share one copy (a /dev/shm path keeps it in RAM)
+MODEL_SNAPSHOT_PATH = "data/model_snapshot"
+# MD5s recorded per file name (the MovieLens md5 list), and the MD5s of any
+# other data file, hashed once and cached per path, size and mtime
+DATA_CHECKSUMS_PATH = "data/checksums.txt"
+DATA_DIGEST_CACHE_PATH = "data/checksums_cache.json"
+
+# The app loads the model in the background and serves these popular movies
+# (saved by the last run that finished loading) until it is ready
+POPULAR_FALLBACK_PATH = "data/popular_fallback.json"
+POPULAR_FALLBACK_SIZE = 50
+
 # Dummy Data Generator (Used if CSVs are missing)
 AUTO_CREATE_DUMMY_DATA = True
 DUMMY_MOVIES_COUNT = 50
@@ -0,0 +1,64 @@
+"""
+Genre-term index for content-based scoring.
+
+Every movie's genre terms are encoded once as idf-weighted, L2-normalized
+rows of a sparse matrix. Scoring a genre profile is then a dictionary
+lookup per genre and a single sparse matrix-vector product, memoized per
+genre multiset. Genre masks come from the catalog's bitset
+(Catalog.genre_mask).
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import scipy.sparse as sp
+
+
+class GenreIndex:
+    """Precomputed genre-term weights and norms for the catalog"""
+
+    def __init__(self, tfidf, tfidf_matrix, cache_size=256):
+        self.vocabulary = tfidf.vocabulary_
+        self.idf = np.asarray(tfidf.idf_, dtype=np.float64)
+        self.analyzer = tfidf.build_analyzer()
+        # tfidf_matrix rows are already tf * idf / ||tf * idf||, so the
+        # per-movie norms are folded into the weights
+        self.weights = sp.csr_matrix(tfidf_matrix)
+
+        self._term_cols = {}
+        self._score_cached = lru_cache(maxsize=cache_size)(self._score)
+
+    @property
+    def n_terms(self):
+        return len(self.idf)
+
+    def term_columns(self, genre):
+        """Term columns for a genre name, tokenized once and remembered"""
+        cols = self._term_cols.get(genre)
+        if cols is None:
+            cols = [self.vocabulary[t] for t in self.analyzer(genre) if t in self.vocabulary]
+            self._term_cols[genre] = cols
+        return cols
+
+    def profile(self, genres):
+        """Normalized tf-idf vector for a list of genres (duplicates count twice)"""
+        counts = np.zeros(self.n_terms, dtype=np.float64)
+        for genre in genres:
+            for col in self.term_columns(genre):
+                counts[col] += 1.0
+        vector = counts * self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _score(self, genre_key):
+        scores = self.weights @ self.profile(genre_key)
+        scores.flags.writeable = False
+        return scores
+
+    def score(self, genres):
+        """Cosine similarity of every movie to a genre profile (read-only, memoized)"""
+        return self._score_cached(tuple(sorted(genres)))
+
+    def cache_info(self):
+        return self._score_cached.cache_info()
+
@@ -0,0 +1,233 @@
+"""
+Incremental rating updates.
+
+Ratings added at runtime go into a small pending buffer next to the
+compacted CSR matrices instead of triggering a rebuild. The rating vectors
+of the movies a batch touches are assembled from both (a newer rating of a
+movie by the same user replaces the older one), which is all the neighbor
+and popularity refresh for those movies needs. Once the buffer grows past
+a threshold it is merged into the CSR matrices (compaction).
+
+Accepted ratings are also appended to a log file (RatingsLog) before they
+are applied, so a restart never loses them. Every compaction folds the
+logged ratings into a new model snapshot and moves them from the log to
+an archive next to it; a start replays only the ratings logged after the
+snapshot it loaded (and the archive too after a rebuild from the data files).
+"""
+
+import hashlib
+import io
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def overlay(base, updates):
+    """base with every entry present in updates replaced by the update's value"""
+    base = sp.csr_matrix(base, dtype=np.float32, copy=True)
+    base.resize(updates.shape)
+    merged = base - base.multiply(updates != 0) + updates
+    merged = sp.csr_matrix(merged, dtype=np.float32)
+    merged.eliminate_zeros()
+    return merged
+
+
+def row_norms(matrix):
+    """L2 norm of every row of a sparse matrix"""
+    return np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1), dtype=np.float64).ravel())
+
+
+class PendingRatings:
+    """Ratings appended since the last compaction, as parallel arrays"""
+
+    def __init__(self):
+        self.users = np.empty(0, dtype=np.int32)
+        self.cols = np.empty(0, dtype=np.int32)
+        self.ratings = np.empty(0, dtype=np.float32)
+        self._matrix = None
+
+    def __len__(self):
+        return len(self.ratings)
+
+    def append(self, user_rows, cols, ratings):
+        self.users = np.concatenate([self.users, np.asarray(user_rows, dtype=np.int32)])
+        self.cols = np.concatenate([self.cols, np.asarray(cols, dtype=np.int32)])
+        self.ratings = np.concatenate([self.ratings, np.asarray(ratings, dtype=np.float32)])
+        self._matrix = None
+
+    def clear(self):
+        self.__init__()
+
+    @property
+    def touched_cols(self):
+        return np.unique(self.cols)
+
+    def matrix(self, n_items, n_users):
+        """Pending ratings as an items x users CSR matrix (latest rating wins)"""
+        if self._matrix is None or self._matrix.shape != (n_items, n_users):
+            # Keep only the last rating of each (movie, user) pair
+            keys = self.cols.astype(np.int64) * n_users + self.users
+            _, last = np.unique(keys[::-1], return_index=True)
+            keep = len(keys) - 1 - last
+            self._matrix = sp.csr_matrix(
+                (self.ratings[keep], (self.cols[keep], self.users[keep])),
+                shape=(n_items, n_users), dtype=np.float32
+            )
+        return self._matrix
+
+    def item_vectors(self, item_user_matrix, cols, n_users):
+        """Current rating vectors of some movies: compacted rows overlaid with pending ratings"""
+        updates = self.matrix(item_user_matrix.shape[0], n_users)
+        return overlay(item_user_matrix[cols], updates[cols])
+
+    def compact(self, item_user_matrix, n_users):
+        """Item-user matrix with all pending ratings merged in"""
+        return overlay(item_user_matrix, self.matrix(item_user_matrix.shape[0], n_users))
+
+
+class RatingsLog:
+    """
+    Append-only CSV of the ratings accepted at runtime.
+
+    Positions in the log are byte offsets of line starts. rotate() moves
+    the lines before an offset to the archive log (path.folded.csv).
+    """
+
+    HEADER = 'userId,movieId,rating,timestamp\n'
+    COLUMNS = ['userId', 'movieId', 'rating', 'timestamp']
+
+    def __init__(self, path):
+        self.path = path
+
+    @property
+    def archive(self):
+        """Log of the ratings already folded into a snapshot"""
+        root, ext = os.path.splitext(self.path)
+        return RatingsLog(f'{root}.folded{ext}')
+
+    @contextmanager
+    def _locked(self):
+        """The log opened for appending and exclusively locked"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        while True:
+            f = open(self.path, 'a+b')
+            if fcntl is None:
+                break
+            fcntl.flock(f, fcntl.LOCK_EX)
+            # A rotation may have replaced the file while this one waited
+            try:
+                if os.stat(self.path).st_ino == os.fstat(f.fileno()).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            f.close()
+        try:
+            yield f
+        finally:
+            f.close()
+
+    def append(self, user_ids, movie_ids, ratings):
+        """Write ratings to disk before they are applied; raises OSError on failure"""
+        timestamp = int(time.time())
+        lines = ''.join(
+            f'{int(user)},{int(movie)},{float(rating):g},{timestamp}\n'
+            for user, movie, rating in zip(user_ids, movie_ids, ratings)
+        )
+        self.append_lines(lines.encode())
+
+    def append_lines(self, lines):
+        """Append raw CSV lines (bytes, header excluded)"""
+        # Workers of one deployment share the file; appends are serialized
+        with self._locked() as f:
+            self._write(f, lines)
+
+    def _write(self, f, lines):
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            lines = self.HEADER.encode() + lines
+        else:
+            # A write cut short by a crash must not run into this one
+            f.seek(size - 1)
+            if f.read(1) != b'\n':
+                lines = b'\n' + lines
+        f.write(lines)
+        f.flush()
+        os.fsync(f.fileno())
+
+    def read(self, start=0):
+        """
+        Ratings logged from byte offset start on, in the order they were accepted.
+
+        Returns (userIds, movieIds, ratings, end, digest): end is the offset
+        after the last complete line, digest the MD5 of the lines read
+        (header excluded), so two readers of the same lines agree on it.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(start)
+                data = f.read()
+        except FileNotFoundError:
+            data = b''
+        header = self.HEADER.encode()
+        if start == 0 and data.startswith(header):
+            start, data = len(header), data[len(header):]
+        # A line still being written (or cut short by a crash) is left for later
+        data = data[:data.rfind(b'\n') + 1]
+        end, digest = start + len(data), hashlib.md5(data).hexdigest()
+
+        empty = (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+        if not data:
+            return (*empty, end, digest)
+        # Torn lines parse as missing values and are dropped
+        frame = pd.read_csv(io.BytesIO(data), names=self.COLUMNS, header=None, usecols=self.COLUMNS[:3],
+                            dtype=str, on_bad_lines='skip').apply(pd.to_numeric, errors='coerce').dropna()
+        if frame.empty:
+            return (*empty, end, digest)
+        return (
+            frame['userId'].to_numpy(dtype=np.int32),
+            frame['movieId'].to_numpy(dtype=np.int32),
+            frame['rating'].to_numpy(dtype=np.float32),
+            end,
+            digest
+        )
+
+    def prefix_digest(self, offset):
+        """MD5 of the first offset bytes of the log, or None if it is shorter"""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read(offset)
+        except FileNotFoundError:
+            return None
+        if len(data) < offset:
+            return None
+        return hashlib.md5(data).hexdigest()
+
+    def rotate(self, end):
+        """Move the lines before byte offset end to the archive; later ones stay in the log"""
+        with self._locked() as f:
+            f.seek(0)
+            data = f.read()
+            folded, tail = data[:end], data[end:]
+            header = self.HEADER.encode()
+            if folded.startswith(header):
+                folded = folded[len(header):]
+            if folded:
+                self.archive.append_lines(folded)
+
+            staging = f'{self.path}.tmp'
+            with open(staging, 'wb') as out:
+                out.write(header + tail)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(staging, self.path)
@@ -0,0 +1,263 @@
+"""
+Streaming ratings ingest for large MovieLens dumps.
+
+ratings.csv is read in fixed-size chunks with compact dtypes and only the
+columns the recommender needs, and each chunk is written straight into
+preallocated int32/float32 COO buffers. The full ratings frame is never
+held in memory; the buffers are compressed into a CSR user-item matrix at
+the end.
+
+load_ratings_parallel splits the file into byte ranges instead and parses
+them on a process pool (used by build_model.py).
+
+Report ingest throughput for a file from the command line:
+
+    python ingest.py data/ratings.csv [--movies data/movies.csv]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+from concurrent.futures import as_completed
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RATING_COLUMNS = ['userId', 'movieId', 'rating']
+RATING_DTYPES = {'userId': np.int32, 'movieId': np.int32, 'rating': np.float32}
+
+
+def peak_memory_mb():
+    """Peak resident set size of this process in MB (None if unavailable)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def count_data_rows(path, block_size=1 << 24):
+    """Count CSV data rows (lines minus the header) without parsing them"""
+    lines = 0
+    last = b'\n'
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            lines += block.count(b'\n')
+            last = block[-1:]
+    if last != b'\n':
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def movie_columns_from(movie_pos, movie_ids):
+    """Map movieIds to catalog columns through a movieId -> column table (-1 if unknown)"""
+    movie_ids = np.asarray(movie_ids, dtype=np.int64)
+    columns = np.full(movie_ids.shape, -1, dtype=np.int32)
+    in_range = (movie_ids >= 0) & (movie_ids < len(movie_pos))
+    columns[in_range] = movie_pos[movie_ids[in_range]]
+    return columns
+
+
+def read_ratings_range(ratings_csv, names, start, stop, movie_pos):
+    """
+    Parse the ratings whose line starts in the byte range [start, stop).
+
+    Returns (userIds, catalog columns, ratings) arrays.
+    """
+    with open(ratings_csv, 'rb') as f:
+        # Skip the line running into the range; it belongs to the previous one
+        f.seek(start - 1)
+        f.readline()
+        position = f.tell()
+        data = f.read(max(stop - position, 0))
+        if data and not data.endswith(b'\n'):
+            data += f.readline()
+    if not data.strip():
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+    chunk = pd.read_csv(io.BytesIO(data), header=None, names=names, usecols=RATING_COLUMNS, dtype=RATING_DTYPES)
+    return (
+        chunk['userId'].to_numpy(),
+        movie_columns_from(movie_pos, chunk['movieId'].to_numpy()),
+        chunk['rating'].to_numpy()
+    )
+
+
+def load_ratings_parallel(ratings_csv, movie_pos, n_movies, pool, n_parts, verbose=True):
+    """
+    load_ratings_sparse on a process pool: the file is split into n_parts
+    byte ranges parsed concurrently. Returns (user_item_matrix, user_ids, stats).
+    """
+    start_time = time.time()
+    with open(ratings_csv, 'rb') as f:
+        header = f.readline()
+    names = header.decode().strip().split(',')
+    data_start, size = len(header), os.path.getsize(ratings_csv)
+    bounds = np.linspace(data_start, size, n_parts + 1).astype(np.int64)
+
+    futures = {
+        pool.submit(read_ratings_range, ratings_csv, names, int(start), int(stop), movie_pos): i
+        for i, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:]))
+    }
+    parts = {}
+    filled = 0
+    for future in as_completed(futures):
+        users, cols, values = parts[futures[future]] = future.result()
+        filled += len(users)
+        if verbose:
+            print(f"  … {len(parts)}/{len(futures)} parts, {filled:,} ratings read ({time.time() - start_time:.1f}s)")
+
+    # Reassembled in file order, as the streaming loader reads them
+    ordered = [parts[i] for i in range(len(futures))]
+    matrix, user_ids = ratings_to_sparse(
+        np.concatenate([part[0] for part in ordered]) if ordered else np.empty(0, dtype=np.int32),
+        np.concatenate([part[1] for part in ordered]) if ordered else np.empty(0, dtype=np.int32),
+        np.concatenate([part[2] for part in ordered]) if ordered else np.empty(0, dtype=np.float32),
+        n_movies
+    )
+    del parts, ordered
+
+    elapsed = max(time.time() - start_time, 1e-9)
+    stats = {
+        'rows': filled,
+        'ratings': int(matrix.nnz),
+        'users': len(user_ids),
+        'seconds': elapsed,
+        'rows_per_sec': filled / elapsed,
+        'peak_memory_mb': peak_memory_mb()
+    }
+    if verbose:
+        print(f"✓ Ingested {filled:,} ratings in {elapsed:.1f}s ({stats['rows_per_sec']:,.0f} rows/sec)")
+    return matrix, user_ids, stats
+
+
+def ratings_to_sparse(user_ids, movie_cols, ratings, n_movies):
+    """Build a CSR user-item matrix from raw userIds and catalog columns"""
+    user_ids = np.asarray(user_ids, dtype=np.int32)
+    movie_cols = np.asarray(movie_cols, dtype=np.int32)
+    known = movie_cols >= 0
+
+    # userIds are small positive integers, so a lookup table beats np.unique's
+    # int64 inverse array on 32M rows
+    user_ids = user_ids[known]
+    seen = np.zeros(int(user_ids.max()) + 1 if len(user_ids) else 0, dtype=bool)
+    seen[user_ids] = True
+    unique_users = np.flatnonzero(seen).astype(np.int32)
+    user_pos = np.full(len(seen), -1, dtype=np.int32)
+    user_pos[unique_users] = np.arange(len(unique_users), dtype=np.int32)
+
+    rows = user_pos[user_ids]
+    cols = movie_cols[known]
+    values = np.asarray(ratings, dtype=np.float32)[known]
+
+    # A user who rated a movie twice keeps the later rating (as
+    # PendingRatings does), never the sum. A stable sort on (row, column)
+    # keeps file order within duplicates and is cheap on the mostly sorted
+    # MovieLens files; it also leaves the entries in CSR order.
+    keys = rows.astype(np.int64) * n_movies + cols
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    last = np.ones(len(keys), dtype=bool)
+    last[:-1] = keys[1:] != keys[:-1]
+    keep = order[last]
+    del keys, order, last
+
+    indptr = np.zeros(len(unique_users) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows[keep], minlength=len(unique_users)), out=indptr[1:])
+    matrix = sp.csr_matrix((values[keep], cols[keep], indptr), shape=(len(unique_users), n_movies))
+    matrix.has_canonical_format = True
+    return matrix, unique_users
+
+
+def load_ratings_sparse(ratings_csv, movie_columns, n_movies, chunksize=1_000_000, verbose=True):
+    """
+    Stream a ratings CSV into a sparse user-item matrix.
+
+    movie_columns maps an array of movieIds to catalog columns (-1 for
+    unknown movies). Returns (user_item_matrix, user_ids, stats).
+    """
+    start_time = time.time()
+    n_rows = count_data_rows(ratings_csv)
+
+    users = np.empty(n_rows, dtype=np.int32)
+    cols = np.empty(n_rows, dtype=np.int32)
+    values = np.empty(n_rows, dtype=np.float32)
+
+    filled = 0
+    reader = pd.read_csv(
+        ratings_csv,
+        usecols=RATING_COLUMNS,
+        dtype=RATING_DTYPES,
+        chunksize=chunksize
+    )
+    for chunk in reader:
+        size = len(chunk)
+        if filled + size > len(users):
+            # Row count was an underestimate (e.g. embedded newlines); grow
+            new_size = max(filled + size, int(len(users) * 1.5))
+            users = np.resize(users, new_size)
+            cols = np.resize(cols, new_size)
+            values = np.resize(values, new_size)
+        users[filled:filled + size] = chunk['userId'].to_numpy()
+        cols[filled:filled + size] = movie_columns(chunk['movieId'].to_numpy())
+        values[filled:filled + size] = chunk['rating'].to_numpy()
+        filled += size
+        if verbose:
+            print(f"  … {filled:,} ratings read ({time.time() - start_time:.1f}s)")
+
+    matrix, user_ids = ratings_to_sparse(users[:filled], cols[:filled], values[:filled], n_movies)
+    del users, cols, values
+
+    elapsed = max(time.time() - start_time, 1e-9)
+    stats = {
+        'rows': filled,
+        'ratings': int(matrix.nnz),
+        'users': len(user_ids),
+        'seconds': elapsed,
+        'rows_per_sec': filled / elapsed,
+        'peak_memory_mb': peak_memory_mb()
+    }
+    if verbose:
+        peak = stats['peak_memory_mb']
+        peak_text = f", peak RSS {peak:,.0f} MB" if peak is not None else ""
+        print(f"✓ Ingested {filled:,} ratings in {elapsed:.1f}s "
+              f"({stats['rows_per_sec']:,.0f} rows/sec{peak_text})")
+    return matrix, user_ids, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream a ratings CSV into a sparse matrix')
+    parser.add_argument('ratings_csv', help='ratings file (userId,movieId,rating[,timestamp])')
+    parser.add_argument('--movies', help='movies file used for the movieId -> column mapping')
+    parser.add_argument('--chunksize', type=int, default=1_000_000, help='rows per chunk')
+    args = parser.parse_args()
+
+    if args.movies:
+        movie_ids = pd.read_csv(args.movies, usecols=['movieId'], dtype={'movieId': np.int32})['movieId'].to_numpy()
+    else:
+        # Without a catalog, every movieId seen in the file gets its own column
+        movie_ids = np.unique(pd.read_csv(args.ratings_csv, usecols=['movieId'], dtype={'movieId': np.int32})['movieId'])
+
+    movie_pos = np.full(int(movie_ids.max()) + 1, -1, dtype=np.int32)
+    movie_pos[movie_ids] = np.arange(len(movie_ids), dtype=np.int32)
+
+    matrix, _, stats = load_ratings_sparse(
+        args.ratings_csv, lambda ids: movie_columns_from(movie_pos, ids), len(movie_ids), args.chunksize
+    )
+    size_mb = (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / (1024 * 1024)
+    print(f"  {stats['users']:,} users x {len(movie_ids):,} movies, CSR size {size_mb:,.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+"""
+Movie details (poster, plot, ratings) from OMDb or TMDB.
+
+Every request goes through one pooled requests.Session, so connections to
+the API are kept alive between lookups. The movies of a page are fetched
+concurrently on a shared thread pool under a page-level deadline; movies
+whose lookup misses the deadline are rendered from local data instead.
+
+Results are cached per movieId in a SQLite file (MetadataStore) with an
+in-process LRU in front. Movies listed in data/links.csv are looked up
+directly by imdbId (OMDb) or tmdbId (TMDB) rather than by a title search.
+Found entries expire after a TTL; "not found" answers are cached too, with
+a shorter TTL, while network errors are never cached.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+TMDB_IMAGE_URL = "https://image.tmdb.org/t/p/w500"
+
+
+def read_links(links_csv):
+    """{movieId: (imdb id like 'tt0114709' or None, tmdbId or None)} from links.csv"""
+    if not links_csv or not os.path.exists(links_csv):
+        return {}
+    links = pd.read_csv(links_csv, dtype={'movieId': 'int64', 'imdbId': 'string', 'tmdbId': 'Int64'})
+    imdb_ids = ('tt' + links['imdbId'].str.zfill(7)).astype(object).where(links['imdbId'].notna(), None)
+    tmdb_ids = links['tmdbId'].astype(object).where(links['tmdbId'].notna(), None)
+    return {
+        int(movie_id): (imdb_id, int(tmdb_id) if tmdb_id is not None else None)
+        for movie_id, imdb_id, tmdb_id in zip(links['movieId'], imdb_ids, tmdb_ids)
+    }
+
+
+class MetadataStore:
+    """Movie details keyed by (movieId, provider) in SQLite, with an LRU in front"""
+
+    def __init__(self, path, ttl=30 * 86400, negative_ttl=86400, memory_size=4096):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory_size = memory_size
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            # WAL lets several app workers read while one writes
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS movie_details ('
+                ' movie_id INTEGER NOT NULL,'
+                ' provider TEXT NOT NULL,'
+                ' lookup TEXT NOT NULL,'
+                ' fetched REAL NOT NULL,'
+                ' payload TEXT,'
+                ' PRIMARY KEY (movie_id, provider))'
+            )
+            self._conn.commit()
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _entry(self, key):
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            return entry
+        row = self._conn.execute(
+            'SELECT lookup, fetched, payload FROM movie_details WHERE movie_id = ? AND provider = ?', key
+        ).fetchone()
+        if row is None:
+            return None
+        entry = (row[0], row[1], json.loads(row[2]) if row[2] is not None else None)
+        self._remember(key, entry)
+        return entry
+
+    def _is_fresh(self, entry, lookup, now=None):
+        """Whether a cached (lookup, fetched, details) entry can be served"""
+        if entry is None or entry[0] != lookup:
+            return False
+        ttl = self.ttl if entry[2] is not None else self.negative_ttl
+        return (now or time.time()) - entry[1] < ttl
+
+    def get(self, movie_id, provider, lookup):
+        """(True, details or None) for a fresh entry, (False, None) otherwise"""
+        with self._lock:
+            entry = self._entry((int(movie_id), provider))
+            if not self._is_fresh(entry, lookup):
+                self.misses += 1
+                return False, None
+            self.hits += 1
+        return True, dict(entry[2]) if entry[2] is not None else None
+
+    def put(self, movie_id, provider, lookup, details, fetched=None):
+        """Store details (None records a miss) for a movie"""
+        key = (int(movie_id), provider)
+        entry = (lookup, fetched or time.time(), dict(details) if details is not None else None)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO movie_details VALUES (?, ?, ?, ?, ?)',
+                (key[0], key[1], entry[0], entry[1], json.dumps(entry[2]) if entry[2] is not None else None)
+            )
+            self._conn.commit()
+            self._remember(key, entry)
+
+    def stats(self):
+        with self._lock:
+            count = self._conn.execute('SELECT COUNT(*) FROM movie_details').fetchone()[0]
+        return {'entries': count, 'memory_entries': len(self._memory), 'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class MetadataClient:
+    """OMDb/TMDB lookups over a keep-alive session and a shared thread pool"""
+
+    def __init__(self, provider, api_key, base_url, timeout=5.0, max_workers=10, store=None, links=None):
+        self.provider = provider
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/') if base_url else base_url
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.store = store
+        self.links = links or {}
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._pool = None
+
+    @property
+    def enabled(self):
+        return self.provider is not None
+
+    @property
+    def pool(self):
+        # Threads outlive a page so stragglers past the deadline never block a render
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='metadata')
+        return self._pool
+
+    def lookup_key(self, movie_title, movie_id=None):
+        """How a movie is looked up: 'imdb:<id>', 'tmdb:<id>' or 'title:<title>'"""
+        imdb_id, tmdb_id = self.links.get(movie_id, (None, None)) if movie_id is not None else (None, None)
+        if self.provider == 'omdb' and imdb_id:
+            return f'imdb:{imdb_id}'
+        if self.provider == 'tmdb' and tmdb_id:
+            return f'tmdb:{tmdb_id}'
+        return f'title:{movie_title}'
+
+    def cached(self, movie_title, movie_id=None):
+        """(True, details or None) if the store has a fresh entry, else (False, None)"""
+        if self.store is None or movie_id is None:
+            return False, None
+        return self.store.get(movie_id, self.provider, self.lookup_key(movie_title, movie_id))
+
+    def fetch(self, movie_title, movie_id=None):
+        """Details for one movie, or None (served from the store when fresh)"""
+        if not self.enabled:
+            return None
+        hit, details = self.cached(movie_title, movie_id)
+        if hit:
+            return details
+
+        try:
+            return self.refresh(movie_title, movie_id)
+        except Exception as e:
+            # Errors are not cached, the next render tries again
+            print(f"{self.provider.upper()} API Error for '{movie_title}': {e}")
+            return None
+
+    def refresh(self, movie_title, movie_id=None):
+        """Look a movie up even if cached and store the answer; errors raise"""
+        lookup = self.lookup_key(movie_title, movie_id)
+        details = self.request(lookup)
+        if self.store is not None and movie_id is not None:
+            self.store.put(movie_id, self.provider, lookup, details)
+        return details
+
+    def fetch_many(self, movie_titles, deadline=3.0, movie_ids=None):
+        """
+        Details for several movies at once, in input order.
+
+        Cached movies are answered directly; the rest are looked up
+        concurrently, and any that have not finished deadline seconds after
+        the call are returned as None.
+        """
+        if not self.enabled or not movie_titles:
+            return [None] * len(movie_titles)
+        movie_ids = movie_ids if movie_ids is not None else [None] * len(movie_titles)
+
+        results = [None] * len(movie_titles)
+        futures = {}
+        for i, (title, movie_id) in enumerate(zip(movie_titles, movie_ids)):
+            hit, details = self.cached(title, movie_id)
+            if hit:
+                results[i] = details
+            else:
+                futures[i] = self.pool.submit(self.fetch, title, movie_id)
+        metrics.METADATA_LOOKUPS.inc(len(movie_titles) - len(futures), result='cached')
+        if not futures:
+            return results
+
+        done, pending = wait(futures.values(), timeout=deadline)
+        for future in pending:
+            future.cancel()
+
+        # Movies that missed the deadline are rendered from local data
+        metrics.METADATA_LOOKUPS.inc(len(done), result='fetched')
+        metrics.METADATA_LOOKUPS.inc(len(pending), result='deadline')
+        for i, future in futures.items():
+            if future in done:
+                results[i] = future.result()
+        return results
+
+    def request(self, lookup):
+        """
+        Perform one API lookup ('imdb:…', 'tmdb:…' or 'title:…').
+
+        Returns the details, or None when the API reports no such movie;
+        network and HTTP errors raise.
+        """
+        kind, _, value = lookup.partition(':')
+        if self.provider == 'omdb':
+            if kind == 'imdb':
+                return self._omdb({'i': value})
+            return self._omdb({'t': value.split('(')[0].strip()})
+        if self.provider == 'tmdb':
+            if kind == 'tmdb':
+                return self._tmdb_movie(value)
+            return self._tmdb_search(value)
+        return None
+
+    def _omdb(self, params):
+        params = dict(params, apikey=self.api_key, type='movie', plot='short')
+        response = self.session.get(f"{self.base_url}/", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        if data.get('Response') != 'True':
+            return None
+        return {
+            'poster_url': data.get('Poster', '') if data.get('Poster') != 'N/A' else None,
+            'overview': data.get('Plot', 'No description available.'),
+            'release_date': data.get('Released', ''),
+            'vote_average': float(data.get('imdbRating', 0)) if data.get('imdbRating', 'N/A') != 'N/A' else 0,
+            'director': data.get('Director', ''),
+            'actors': data.get('Actors', ''),
+            'imdb_rating': data.get('imdbRating', 'N/A')
+        }
+
+    @staticmethod
+    def _tmdb_details(movie):
+        return {
+            'poster_url': f"{TMDB_IMAGE_URL}{movie.get('poster_path', '')}" if movie.get('poster_path') else None,
+            'overview': movie.get('overview', 'No description available.'),
+            'release_date': movie.get('release_date', ''),
+            'vote_average': movie.get('vote_average', 0)
+        }
+
+    def _tmdb_movie(self, tmdb_id):
+        response = self.session.get(
+            f"{self.base_url}/movie/{tmdb_id}", params={'api_key': self.api_key}, timeout=self.timeout
+        )
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return self._tmdb_details(response.json())
+
+    def _tmdb_search(self, movie_title):
+        response = self.session.get(
+            f"{self.base_url}/search/movie", params={'api_key': self.api_key, 'query': movie_title},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        results = response.json().get('results', [])
+        return self._tmdb_details(results[0]) if results else None
+
+    def fetch_omdb(self, movie_title):
+        """Fetch movie details from OMDb API by title"""
+        try:
+            return self._omdb({'t': movie_title.split('(')[0].strip()})
+        except Exception as e:
+            print(f"OMDb API Error for '{movie_title}': {e}")
+        return None
+
+    def fetch_tmdb(self, movie_title):
+        """Fetch movie details from TMDB API by title"""
+        try:
+            return self._tmdb_search(movie_title)
+        except Exception as e:
+            print(f"TMDB API Error for '{movie_title}': {e}")
+        return None
@@ -0,0 +1,222 @@
+"""
+In-process metrics in the Prometheus text format.
+
+Counters, gauges and histograms live in one registry per process and are
+rendered by the /metrics endpoint. Hot-path stages are timed with
+timer(path, stage), which is a shared no-op when timing is disabled
+(METRICS_ENABLED in config.py, or set_enabled() at runtime).
+
+No client library is needed; each worker process reports its own numbers,
+so scrape every worker (or sum them in the query).
+"""
+
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+try:
+    from config import METRICS_ENABLED
+except ImportError:
+    METRICS_ENABLED = True
+
+# Seconds, from 100µs scoring stages up to multi-second API round trips
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """One metric family; children are keyed by their label values"""
+
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        """(suffix, label string, value) for every child"""
+        with self._lock:
+            values = dict(self._values)
+        return [('', _format_labels(self.labels, key), value) for key, value in sorted(values.items())]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for suffix, labels, value in self.samples():
+            lines.append(f'{self.name}{suffix}{labels} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        self.observe_key(value, self._key(labels))
+
+    def observe_key(self, value, key):
+        """observe() with the label values already in label order"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._values.get(key)
+            if child is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                child = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            child[0][index] += 1
+            child[1] += value
+            child[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        samples = []
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                samples.append(('_bucket', _format_labels(self.labels, key, le), cumulative))
+            samples.append(('_sum', _format_labels(self.labels, key), total))
+            samples.append(('_count', _format_labels(self.labels, key), count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self.metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'recommender_stage_seconds', 'Time spent in each recommendation stage', ('path', 'stage')
+)
+RECOMMENDATIONS = REGISTRY.counter(
+    'recommender_recommendations_total', 'Users recommended for', ('path',)
+)
+RESULT_CACHE_LOOKUPS = REGISTRY.counter(
+    'recommender_result_cache_lookups_total', 'Ranked-list cache lookups', ('result',)
+)
+POPULAR_FALLBACKS = REGISTRY.counter(
+    'recommender_popular_fallback_total', 'Recommendations answered or padded with popular movies', ('reason',)
+)
+METADATA_LOOKUPS = REGISTRY.counter(
+    'recommender_metadata_lookups_total', 'Movie detail lookups for result pages', ('result',)
+)
+HTTP_REQUESTS = REGISTRY.counter(
+    'http_requests_total', 'HTTP requests', ('endpoint', 'status')
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_seconds', 'HTTP request latency', ('endpoint',)
+)
+MODEL_STATE = REGISTRY.gauge(
+    'recommender_model_state', 'Model load state (1 for the current state)', ('state',)
+)
+
+_enabled = METRICS_ENABLED
+
+
+def set_enabled(enabled):
+    """Switch stage and request timers on or off (counters always count)"""
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def enabled():
+    return _enabled
+
+
+class _Timer:
+    __slots__ = ('key', 'start')
+
+    def __init__(self, key):
+        self.key = key
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        STAGE_SECONDS.observe_key(perf_counter() - self.start, self.key)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(path, stage):
+    """Context manager timing one stage into recommender_stage_seconds"""
+    return _Timer((path, stage)) if _enabled else _NULL_TIMER
+
+
+def render():
+    return REGISTRY.render()
@@ -0,0 +1,111 @@
+"""
+Alternating least squares matrix factorization for collaborative scoring.
+
+The model factorizes the sparse user-item rating matrix R (unrated entries
+count as zero, as in PureSVD) into float32 user and item factors by
+minimizing
+
+    ||R - U V^T||^2 + regularization * (||U||^2 + ||V||^2)
+
+Each half-step is a closed-form solve shared by all rows, U = R V (V^T V +
+lambda I)^-1, so training is a sparse-dense product plus BLAS work per
+iteration; the sparse product is split into row blocks across threads.
+
+A session user (the seed ratings from /step2) is folded in with one small
+f x f least-squares solve, and scoring every movie is one matrix-vector
+product with the item factors.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+
+
+def _threaded_product(matrix, dense, n_threads, block_rows=16384):
+    """matrix @ dense, computed in row blocks on a thread pool"""
+    starts = range(0, matrix.shape[0], block_rows)
+    if n_threads <= 1 or len(starts) <= 1:
+        return np.asarray(matrix @ dense)
+    out = np.empty((matrix.shape[0], dense.shape[1]), dtype=dense.dtype)
+
+    def work(start):
+        stop = min(start + block_rows, matrix.shape[0])
+        out[start:stop] = matrix[start:stop] @ dense
+
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        list(pool.map(work, starts))
+    return out
+
+
+class ALSModel:
+    """Regularized matrix factorization trained by alternating least squares"""
+
+    def __init__(self, factors=64, regularization=10.0, iterations=10, seed=0, n_threads=None):
+        self.factors = factors
+        self.regularization = regularization
+        self.iterations = iterations
+        self.seed = seed
+        self.n_threads = n_threads or os.cpu_count() or 1
+        self.user_factors = None
+        self.item_factors = None
+        self.item_gram = None
+
+    def _half_step(self, ratings, fixed):
+        """Least-squares solve for one side given the other side's factors"""
+        gram = fixed.T @ fixed + self.regularization * np.eye(self.factors, dtype=fixed.dtype)
+        rhs = _threaded_product(ratings, fixed, self.n_threads)
+        return np.linalg.solve(gram, rhs.T).T.astype(np.float32)
+
+    def fit(self, user_item_matrix, verbose=False):
+        """Train on a users x movies sparse rating matrix"""
+        ratings = sp.csr_matrix(user_item_matrix, dtype=np.float32)
+        ratings_t = ratings.T.tocsr()
+        rng = np.random.default_rng(self.seed)
+        self.item_factors = rng.normal(
+            0, 0.01, (ratings.shape[1], self.factors)
+        ).astype(np.float32)
+
+        start_time = time.time()
+        for iteration in range(self.iterations):
+            self.user_factors = self._half_step(ratings, self.item_factors)
+            self.item_factors = self._half_step(ratings_t, self.user_factors)
+            if verbose:
+                print(f"  … ALS iteration {iteration + 1}/{self.iterations} "
+                      f"({time.time() - start_time:.1f}s)")
+
+        self.prepare_fold_in()
+        return self
+
+    def prepare_fold_in(self):
+        """Cache V^T V + lambda I for fold-in solves"""
+        self.item_gram = (
+            self.item_factors.T @ self.item_factors +
+            self.regularization * np.eye(self.factors, dtype=np.float32)
+        ).astype(np.float64)
+
+    @classmethod
+    def from_factors(cls, item_factors, regularization):
+        """Serving-only model from saved item factors"""
+        model = cls(factors=item_factors.shape[1], regularization=regularization)
+        model.item_factors = item_factors
+        model.prepare_fold_in()
+        return model
+
+    def fold_in(self, item_cols, ratings):
+        """Factor vector for a new user from a few (column, rating) pairs"""
+        item_cols = np.asarray(item_cols, dtype=np.int64)
+        ratings = np.asarray(ratings, dtype=np.float64)
+        rhs = self.item_factors[item_cols].T.astype(np.float64) @ ratings
+        return np.linalg.solve(self.item_gram, rhs)
+
+    def fold_in_many(self, user_rows):
+        """Factor vectors for a batch of new users given as a sparse users x movies matrix"""
+        rhs = np.asarray(sp.csr_matrix(user_rows) @ self.item_factors, dtype=np.float64)
+        return np.linalg.solve(self.item_gram, rhs.T).T
+
+    def score(self, user_vector):
+        """Predicted affinity of a user for every movie"""
+        return self.item_factors @ np.asarray(user_vector, dtype=np.float32)
@@ -0,0 +1,200 @@
+"""
+Item-item neighbor index for collaborative filtering.
+
+The top-K cosine neighbors of every movie are computed once, offline, and
+stored as fixed-width arrays (.npy files) that are memory-mapped at request
+time, so scoring a seed movie is a row lookup instead of a KNN search. The
+search itself runs on the engine selected by config.ANN_BACKEND (see ann.py).
+
+The query blocks can be spread over worker processes (workers > 1); each
+worker receives the fitted engine once and answers whole blocks.
+
+Build or refresh the index from the command line (the model snapshot,
+which embeds the neighbor lists, is rewritten with it):
+
+    python neighbors.py [--output data/item_neighbors] [--force]
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import scipy.sparse as sp
+
+from ann import create_engine
+
+
+_worker_engine = None
+
+
+def _init_worker(engine):
+    global _worker_engine
+    _worker_engine = engine
+
+
+def _query_block(start, stop, k):
+    ids, sims = _worker_engine.query(np.arange(start, stop), k)
+    return start, stop, ids, sims
+
+
+def process_context():
+    """fork where available, so workers share the parent's arrays instead of unpickling copies"""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('fork' if 'fork' in methods else None)
+
+
+def matrix_fingerprint(matrix):
+    """Return an MD5 fingerprint of a sparse matrix's shape and contents"""
+    matrix = sp.csr_matrix(matrix)
+    digest = hashlib.md5(str(matrix.shape).encode())
+    for array in (matrix.indptr, matrix.indices, matrix.data):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+class ItemNeighborIndex:
+    """Fixed-width top-K neighbor table: one row of column positions per movie"""
+
+    FILES = ('neighbor_ids.npy', 'similarities.npy', 'movie_ids.npy')
+
+    def __init__(self, neighbor_ids, similarities, movie_ids, fingerprint='', engine=None):
+        self.neighbor_ids = neighbor_ids
+        self.similarities = similarities
+        self.movie_ids = movie_ids
+        self.fingerprint = fingerprint
+        # {'backend': ..., 'options': {...}} of the engine that built the index
+        self.engine = engine or {'backend': 'brute', 'options': {}}
+
+    @property
+    def k(self):
+        return self.neighbor_ids.shape[1]
+
+    @classmethod
+    def build(cls, item_user_matrix, movie_ids, k=50, backend='brute', options=None,
+              chunk_size=256, verbose=False, workers=1):
+        """Compute top-K cosine neighbors for every row of an item-user matrix"""
+        options = dict(options or {})
+        engine = create_engine(backend, **options).fit(item_user_matrix)
+        n_items = item_user_matrix.shape[0]
+        width = min(k, max(n_items - 1, 0))
+
+        neighbor_ids = np.full((n_items, width), -1, dtype=np.int32)
+        similarities = np.zeros((n_items, width), dtype=np.float32)
+
+        start_time = time.time()
+        blocks = [(start, min(start + chunk_size, n_items)) for start in range(0, n_items, chunk_size)]
+        if workers > 1 and len(blocks) > 1:
+            with ProcessPoolExecutor(workers, mp_context=process_context(),
+                                     initializer=_init_worker, initargs=(engine,)) as pool:
+                futures = [pool.submit(_query_block, start, stop, width) for start, stop in blocks]
+                done = 0
+                for future in as_completed(futures):
+                    start, stop, neighbor_ids[start:stop], similarities[start:stop] = future.result()
+                    done += stop - start
+                    if verbose:
+                        print(f"  … {done}/{n_items} movies ({time.time() - start_time:.1f}s)")
+        else:
+            for start, stop in blocks:
+                neighbor_ids[start:stop], similarities[start:stop] = engine.query(
+                    np.arange(start, stop), width
+                )
+                if verbose:
+                    print(f"  … {stop}/{n_items} movies ({time.time() - start_time:.1f}s)")
+
+        return cls(neighbor_ids, similarities, np.asarray(movie_ids, dtype=np.int32),
+                   matrix_fingerprint(item_user_matrix), {'backend': backend, 'options': options})
+
+    def save(self, path):
+        """Write the index as .npy arrays plus a small JSON manifest"""
+        os.makedirs(path, exist_ok=True)
+        for name, array in zip(self.FILES, (self.neighbor_ids, self.similarities, self.movie_ids)):
+            np.save(os.path.join(path, name), np.ascontiguousarray(array))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'k': self.k, 'fingerprint': self.fingerprint, 'engine': self.engine}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a saved index, memory-mapping the arrays by default"""
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        mmap_mode = 'r' if mmap else None
+        arrays = [np.load(os.path.join(path, name), mmap_mode=mmap_mode) for name in cls.FILES]
+        return cls(*arrays, fingerprint=meta.get('fingerprint', ''), engine=meta.get('engine'))
+
+    def matches(self, movie_ids, fingerprint, engine):
+        """Check whether this index was built from the given data and engine"""
+        return (
+            self.fingerprint == fingerprint and
+            self.engine == engine and
+            len(self.movie_ids) == len(movie_ids) and
+            np.array_equal(self.movie_ids, movie_ids)
+        )
+
+    def neighbors(self, movie_col, n=None):
+        """Return (column positions, similarities) of a movie's neighbors"""
+        ids = self.neighbor_ids[movie_col, :n]
+        sims = self.similarities[movie_col, :n]
+        valid = ids >= 0
+        return ids[valid], sims[valid]
+
+
+def load_or_build_index(item_user_matrix, movie_ids, path, k=50, backend='brute', options=None):
+    """Load the neighbor index from disk, rebuilding it if missing or stale"""
+    fingerprint = matrix_fingerprint(item_user_matrix)
+    engine = {'backend': backend, 'options': dict(options or {})}
+    if path and os.path.exists(os.path.join(path, 'meta.json')):
+        try:
+            index = ItemNeighborIndex.load(path)
+            if index.k >= min(k, len(movie_ids) - 1) and index.matches(movie_ids, fingerprint, engine):
+                print(f"✓ Loaded item neighbor index from {path}")
+                return index
+            print("⚠ Item neighbor index is stale, rebuilding...")
+        except (OSError, ValueError) as e:
+            print(f"⚠ Could not load item neighbor index: {e}")
+
+    start_time = time.time()
+    index = ItemNeighborIndex.build(item_user_matrix, movie_ids, k=k, backend=backend, options=options)
+    print(f"✓ Built item neighbor index (k={index.k}, {backend}) in {time.time() - start_time:.1f}s")
+
+    if path:
+        try:
+            index.save(path)
+        except OSError as e:
+            print(f"⚠ Could not save item neighbor index: {e}")
+    return index
+
+
+def main():
+    import snapshot
+    from config import MODEL_SNAPSHOT_PATH, NEIGHBOR_INDEX_PATH
+    from recommender import MovieRecommender
+
+    parser = argparse.ArgumentParser(description='Build the item-item neighbor index')
+    parser.add_argument('--output', default=NEIGHBOR_INDEX_PATH, help='index directory')
+    parser.add_argument('--snapshot', default=MODEL_SNAPSHOT_PATH, help='model snapshot to rewrite')
+    parser.add_argument('--force', action='store_true', help='rebuild even if the index is up to date')
+    args = parser.parse_args()
+
+    manifest = os.path.join(args.output, 'meta.json')
+    if args.force and os.path.exists(manifest):
+        os.remove(manifest)
+
+    # Built from the data, not from the snapshot (which would bring its own
+    # neighbor lists) and without the runtime ratings log, which is replayed
+    # on top of the snapshot rather than saved into it
+    recommender = MovieRecommender(neighbor_index_path=args.output, snapshot_path=None, ratings_log_path=None)
+    index = recommender.neighbor_index
+    print(f"✓ {index.neighbor_ids.shape[0]} x {index.k} neighbor index ready in {args.output}")
+
+    if args.snapshot:
+        with snapshot.build_lock(args.snapshot):
+            recommender.save_snapshot(args.snapshot)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""
+Bulk prefetch of movie details into the metadata cache.
+
+Walks data/links.csv and looks every movie up through the configured API
+(OMDb or TMDB, see config.py), storing the answers in the same SQLite
+cache the app reads, so the first visitor to see a movie does not pay the
+API round trip.
+
+- Lookups run on a bounded thread pool behind a token-bucket rate limit.
+- Progress is checkpointed to a JSON file; an interrupted run resumes from
+  the first movie that had not finished. The saved counters cover exactly
+  the movies before that point, so a resumed run does not count twice.
+- --incremental only fetches movies that are missing from the cache or
+  whose entry has expired. Errors are never cached, so a later
+  incremental run retries them.
+
+    python prefetch.py [--rate 10] [--workers 8] [--incremental] [--limit 1000] [--api-key KEY]
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from metadata import MetadataClient, MetadataStore, read_links
+
+DEFAULT_CHECKPOINT_PATH = "data/metadata_prefetch.json"
+
+
+class TokenBucket:
+    """Allow rate acquisitions per second on average, with bursts up to capacity"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait_seconds = (1.0 - self.tokens) / self.rate
+            time.sleep(wait_seconds)
+
+
+def read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_checkpoint(path, checkpoint):
+    """Write the checkpoint atomically"""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    staging = f'{path}.tmp'
+    with open(staging, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(staging, path)
+
+
+def read_titles(movies_csv):
+    """{movieId: title}, used for movies without an API id"""
+    if not movies_csv or not os.path.exists(movies_csv):
+        return {}
+    movies = pd.read_csv(movies_csv, usecols=['movieId', 'title'])
+    return dict(zip(movies['movieId'].astype(int), movies['title']))
+
+
+def prefetch(client, movie_ids, titles, checkpoint_path, rate=10.0, workers=8,
+             incremental=False, resume=True, checkpoint_every=100, verbose=True):
+    """
+    Look up movie_ids (in order) and store the answers in client.store.
+
+    Returns the final checkpoint, which carries the run's counters.
+    """
+    checkpoint = read_checkpoint(checkpoint_path) if resume else None
+    if (checkpoint is None or checkpoint.get('complete') or
+            checkpoint.get('provider') != client.provider or checkpoint.get('total') != len(movie_ids)):
+        checkpoint = {
+            'provider': client.provider,
+            'total': len(movie_ids),
+            'position': 0,
+            'complete': False,
+            'counts': {'found': 0, 'missing': 0, 'errors': 0, 'skipped': 0}
+        }
+    elif verbose:
+        print(f"✓ Resuming at movie {checkpoint['position']:,} of {len(movie_ids):,}")
+
+    counts = checkpoint['counts']
+    bucket = TokenBucket(rate)
+    # Results of finished movies past the checkpoint position, by index
+    done = {}
+    start_time = time.time()
+    start_position = checkpoint['position']
+
+    def work(movie_id):
+        title = titles.get(movie_id, '')
+        if incremental and client.cached(title, movie_id)[0]:
+            return 'skipped'
+        if not title and client.lookup_key(title, movie_id).startswith('title:'):
+            # No API id and no title to search for
+            return 'skipped'
+        bucket.acquire()
+        try:
+            details = client.refresh(title, movie_id)
+        except Exception as e:
+            if verbose:
+                print(f"⚠ Lookup failed for movie {movie_id}: {e}")
+            return 'errors'
+        return 'found' if details is not None else 'missing'
+
+    def save(position):
+        checkpoint['position'] = position
+        checkpoint['updated'] = time.time()
+        write_checkpoint(checkpoint_path, checkpoint)
+
+    position = start_position
+    pending = {}
+    next_index = start_position
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while next_index < len(movie_ids) or pending:
+            # Keep a bounded window in flight so memory and the checkpoint gap stay small
+            while next_index < len(movie_ids) and len(pending) < workers * 4:
+                pending[pool.submit(work, movie_ids[next_index])] = next_index
+                next_index += 1
+
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                done[pending.pop(future)] = future.result()
+
+            # The checkpoint (and its counters) only advance past movies
+            # that are all finished; later ones are redone after a resume
+            advanced = position
+            while advanced in done:
+                counts[done.pop(advanced)] += 1
+                advanced += 1
+            if advanced // checkpoint_every > position // checkpoint_every:
+                save(advanced)
+                if verbose:
+                    elapsed = max(time.time() - start_time, 1e-9)
+                    print(f"  … {advanced:,}/{len(movie_ids):,} movies "
+                          f"({(advanced - start_position) / elapsed:,.1f}/sec)")
+            position = advanced
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        save(position)
+        print(f"⚠ Interrupted, checkpoint saved at movie {position:,}")
+        raise
+    pool.shutdown()
+
+    checkpoint['complete'] = True
+    save(position)
+    return checkpoint
+
+
+def api_client(provider, api_key, max_workers):
+    """Client for provider with an explicit API key, storing into the configured cache"""
+    from config import (
+        API_TIMEOUT, METADATA_CACHE_PATH, METADATA_MEMORY_SIZE, METADATA_NEGATIVE_TTL, METADATA_TTL,
+        OMDB_BASE_URL, TMDB_BASE_URL
+    )
+    store = None
+    if METADATA_CACHE_PATH:
+        store = MetadataStore(METADATA_CACHE_PATH, METADATA_TTL, METADATA_NEGATIVE_TTL, METADATA_MEMORY_SIZE)
+    base_url = OMDB_BASE_URL if provider == 'omdb' else TMDB_BASE_URL
+    return MetadataClient(provider, api_key, base_url, API_TIMEOUT, max_workers, store)
+
+
+def main():
+    from config import LINKS_PATH, MOVIES_DATASET_PATH, USE_TMDB
+    from recommender import MovieRecommender
+
+    parser = argparse.ArgumentParser(description='Prefetch movie details into the metadata cache')
+    parser.add_argument('--links', default=LINKS_PATH, help='movieId,imdbId,tmdbId file')
+    parser.add_argument('--movies', default=MOVIES_DATASET_PATH, help='titles for movies without an API id')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT_PATH)
+    parser.add_argument('--rate', type=float, default=10.0, help='API requests per second')
+    parser.add_argument('--workers', type=int, default=8, help='concurrent lookups')
+    parser.add_argument('--incremental', action='store_true', help='only fetch missing or expired entries')
+    parser.add_argument('--restart', action='store_true', help='ignore an existing checkpoint')
+    parser.add_argument('--limit', type=int, help='only the first N movies of links.csv')
+    parser.add_argument('--base-url', help='override the API base URL (e.g. a local test server)')
+    parser.add_argument('--api-key', help='API key to use instead of the one in config.py')
+    parser.add_argument('--provider', choices=['omdb', 'tmdb'],
+                        help='API the --api-key belongs to (default: tmdb if USE_TMDB, else omdb)')
+    args = parser.parse_args()
+
+    if args.api_key:
+        provider = args.provider or ('tmdb' if USE_TMDB else 'omdb')
+        client = api_client(provider, args.api_key, args.workers)
+    else:
+        client = MovieRecommender.create_metadata_client(use_links=False, max_workers=args.workers)
+    if not client.enabled or client.store is None:
+        print("⚠ No metadata API or cache configured in config.py (or --api-key), nothing to prefetch")
+        return
+    client.links = read_links(args.links)
+    if args.base_url:
+        client.base_url = args.base_url.rstrip('/')
+
+    movie_ids = list(client.links)[:args.limit]
+    titles = read_titles(args.movies)
+    print(f"Prefetching {len(movie_ids):,} movies from {client.provider.upper()} "
+          f"({args.workers} workers, {args.rate:g} requests/sec)")
+
+    start_time = time.time()
+    checkpoint = prefetch(client, movie_ids, titles, args.checkpoint, args.rate, args.workers,
+                          args.incremental, resume=not args.restart)
+    counts = checkpoint['counts']
+    print(f"✓ Done in {time.time() - start_time:.1f}s: {counts['found']:,} found, "
+          f"{counts['missing']:,} not found, {counts['errors']:,} errors, {counts['skipped']:,} skipped")
+
+
+if __name__ == '__main__':
+    main()
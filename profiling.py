@@ -0,0 +1,221 @@
+"""
+Opt-in per-request profiling.
+
+A sampled fraction of requests (PROFILE_SAMPLE_RATE, set from the
+MOVIE_PROFILE environment variable) and every request carrying a valid
+signed X-Profile header run under cProfile and tracemalloc. Each capture is
+written to PROFILE_DIR as
+
+    <id>.prof   cProfile stats (pstats, snakeviz, ...)
+    <id>.json   request info, the top functions by cumulative time and the
+                top allocations by size
+
+and only the newest PROFILE_KEEP captures are kept. One request is profiled
+at a time; tracemalloc sees every thread, so concurrent requests can show up
+in the allocation list.
+
+The header is "<unix time>.<hex HMAC-SHA256 of '<unix time>:<path>'>" keyed
+with PROFILE_SECRET and is accepted for 5 minutes. Print one with
+
+    python profiling.py /results
+"""
+
+import cProfile
+import hashlib
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+
+HEADER = 'X-Profile'
+SIGNATURE_MAX_AGE = 300
+
+
+def parse_sample_rate(value):
+    """
+    Profiling sample rate from a setting such as MOVIE_PROFILE.
+
+    Accepts a fraction between 0 and 1 (values above 1 mean every
+    request) or yes/true/on. Anything else turns sampling off with a
+    warning instead of stopping the app.
+    """
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ('yes', 'true', 'on'):
+            return 1.0
+        if value in ('', 'no', 'false', 'off'):
+            return 0.0
+    try:
+        rate = float(value or 0)
+    except (TypeError, ValueError):
+        rate = float('nan')
+    if not rate >= 0:
+        print(f"⚠ Ignoring profiling sample rate {value!r}: expected a fraction such as 0.01, or 1")
+        return 0.0
+    return min(rate, 1.0)
+
+
+def sign(secret, path, timestamp=None):
+    """X-Profile header value for a request to path"""
+    timestamp = str(int(timestamp if timestamp is not None else time.time()))
+    digest = hmac.new(secret.encode(), f'{timestamp}:{path}'.encode(), hashlib.sha256).hexdigest()
+    return f'{timestamp}.{digest}'
+
+
+def verify(secret, path, value, now=None):
+    """Whether an X-Profile header value is a fresh signature for path"""
+    if not secret or not value or '.' not in value:
+        return False
+    timestamp, _, digest = value.partition('.')
+    if not timestamp.isdigit() or abs((now or time.time()) - int(timestamp)) > SIGNATURE_MAX_AGE:
+        return False
+    return hmac.compare_digest(sign(secret, path, int(timestamp)), value)
+
+
+class Capture:
+    """One request running under cProfile and tracemalloc"""
+
+    def __init__(self, top_allocations):
+        self.top_allocations = top_allocations
+        self.started = time.time()
+        self.profile = cProfile.Profile()
+        self._trace_started = not tracemalloc.is_tracing()
+        if self._trace_started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self._before = tracemalloc.take_snapshot()
+        self.profile.enable()
+
+    def stop(self):
+        """Stop profiling; returns (stats, top allocations, peak traced bytes)"""
+        self.profile.disable()
+        after = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        if self._trace_started:
+            tracemalloc.stop()
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        diff = after.filter_traces(filters).compare_to(self._before.filter_traces(filters), 'lineno')
+        allocations = [
+            {'location': str(stat.traceback), 'size_diff': stat.size_diff, 'count_diff': stat.count_diff}
+            for stat in diff[:self.top_allocations]
+        ]
+        return pstats.Stats(self.profile), allocations, peak
+
+
+class Profiler:
+    """Decides which requests to profile and manages the capture directory"""
+
+    def __init__(self, directory, sample_rate=0.0, secret=None, keep=50, endpoints=None,
+                 top_functions=40, top_allocations=25):
+        self.directory = directory
+        self.sample_rate = parse_sample_rate(sample_rate)
+        self.secret = secret
+        self.keep = keep
+        self.endpoints = set(endpoints) if endpoints else None
+        self.top_functions = top_functions
+        self.top_allocations = top_allocations
+        self._busy = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or bool(self.secret)
+
+    def authorized(self, path, header_value):
+        return verify(self.secret, path, header_value)
+
+    def start(self, endpoint, path, header_value=None):
+        """A Capture if this request should be profiled, else None"""
+        if not self.enabled or (self.endpoints is not None and endpoint not in self.endpoints):
+            return None
+        if not self.authorized(path, header_value) and random.random() >= self.sample_rate:
+            return None
+        # Profilers are process-wide; a request arriving mid-capture runs unprofiled
+        if not self._busy.acquire(blocking=False):
+            return None
+        try:
+            return Capture(self.top_allocations)
+        except Exception:
+            self._busy.release()
+            raise
+
+    def finish(self, capture, info):
+        """Stop a capture and write it to the profile directory; returns its id"""
+        try:
+            stats, allocations, peak = capture.stop()
+        finally:
+            self._busy.release()
+
+        elapsed = time.time() - capture.started
+        capture_id = (f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(capture.started))}-"
+                      f"{info.get('endpoint', 'request')}-{uuid.uuid4().hex[:6]}")
+        os.makedirs(self.directory, exist_ok=True)
+        stats.dump_stats(os.path.join(self.directory, f'{capture_id}.prof'))
+
+        report = io.StringIO()
+        stats.stream = report
+        stats.sort_stats('cumulative').print_stats(self.top_functions)
+        record = dict(info, id=capture_id, started=capture.started, seconds=elapsed,
+                      peak_traced_bytes=peak, functions=report.getvalue(), allocations=allocations)
+        staging = os.path.join(self.directory, f'{capture_id}.json.tmp')
+        with open(staging, 'w') as f:
+            json.dump(record, f, indent=2)
+        os.replace(staging, os.path.join(self.directory, f'{capture_id}.json'))
+
+        self.rotate()
+        return capture_id
+
+    def rotate(self):
+        """Delete all but the newest self.keep captures"""
+        for capture_id in [entry['id'] for entry in self.index()][self.keep:]:
+            for suffix in ('.json', '.prof'):
+                try:
+                    os.remove(os.path.join(self.directory, capture_id + suffix))
+                except OSError:
+                    pass
+
+    def index(self):
+        """Captures on disk, newest first, without their reports"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        entries = []
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            record = self.load(name[:-len('.json')])
+            if record is not None:
+                record.pop('functions', None)
+                record.pop('allocations', None)
+                entries.append(record)
+        return sorted(entries, key=lambda entry: entry['started'], reverse=True)
+
+    def path(self, capture_id, suffix):
+        """File of a capture, or None for ids that are not plain capture names"""
+        if not capture_id or os.path.basename(capture_id) != capture_id or capture_id.startswith('.'):
+            return None
+        return os.path.join(self.directory, capture_id + suffix)
+
+    def load(self, capture_id):
+        path = self.path(capture_id, '.json')
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (TypeError, OSError, ValueError):
+            return None
+
+
+if __name__ == '__main__':
+    from config import PROFILE_SECRET
+
+    if len(sys.argv) != 2 or not PROFILE_SECRET:
+        print("usage: MOVIE_PROFILE_SECRET=... python profiling.py <path>")
+        sys.exit(1)
+    print(f"{HEADER}: {sign(PROFILE_SECRET, sys.argv[1])}")
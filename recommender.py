@@ -1,49 +1,307 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+
 import pandas as pd
 import numpy as np
+import scipy.sparse as sp
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.neighbors import NearestNeighbors
-import requests
+
+from catalog import Catalog
+from genre_index import GenreIndex
+from incremental import PendingRatings, RatingsLog, row_norms
+from ingest import load_ratings_sparse, ratings_to_sparse
+from metadata import MetadataClient, MetadataStore, read_links
+from mf import ALSModel
+from ann import topk_rows
+from neighbors import ItemNeighborIndex, load_or_build_index
+from result_cache import ResultCache, canonical_key
+from userknn import UserNeighborIndex
+import metrics
+import snapshot
 
 # Import from config
 try:
     from config import (
-        USE_OMDB, OMDB_API_KEY, USE_TMDB, TMDB_API_KEY, TMDB_BASE_URL,
-        USE_NO_API, CONTENT_WEIGHT, COLLABORATIVE_WEIGHT
+        USE_OMDB, OMDB_API_KEY, OMDB_BASE_URL, USE_TMDB, TMDB_API_KEY, TMDB_BASE_URL,
+        USE_NO_API, API_TIMEOUT, API_MAX_WORKERS, API_PAGE_DEADLINE,
+        LINKS_PATH, METADATA_CACHE_PATH, METADATA_TTL, METADATA_NEGATIVE_TTL, METADATA_MEMORY_SIZE,
+        CONTENT_WEIGHT, COLLABORATIVE_WEIGHT,
+        COLLABORATIVE_NEIGHBORS, NEIGHBOR_TOP_K, NEIGHBOR_INDEX_PATH,
+        MODEL_SNAPSHOT_PATH, DATA_CHECKSUMS_PATH, DATA_DIGEST_CACHE_PATH, CONTENT_CACHE_SIZE,
+        ANN_BACKEND, ANN_OPTIONS, COLLABORATIVE_MODEL,
+        ALS_FACTORS, ALS_REGULARIZATION, ALS_ITERATIONS, USER_NEIGHBORS, USER_MAX_CANDIDATES,
+        BATCH_CHUNK_SIZE, RESULT_CACHE_SIZE, RESULT_CACHE_TTL, RESULT_CACHE_SHARED_PATH, RATINGS_COMPACT_THRESHOLD,
+        RATINGS_LOG_PATH
     )
 except ImportError:
     # Fallback if config.py not found
     print("⚠️ config.py not found, using default settings")
     USE_OMDB = False
     OMDB_API_KEY = "YOUR_OMDB_KEY_HERE"
+    OMDB_BASE_URL = "http://www.omdbapi.com/"
     USE_TMDB = False
     TMDB_API_KEY = "YOUR_TMDB_KEY_HERE"
     TMDB_BASE_URL = "https://api.themoviedb.org/3"
     USE_NO_API = True
+    API_TIMEOUT = 5
+    API_MAX_WORKERS = 10
+    API_PAGE_DEADLINE = 3.0
+    LINKS_PATH = "data/links.csv"
+    METADATA_CACHE_PATH = "data/metadata_cache.sqlite3"
+    METADATA_TTL = 30 * 86400
+    METADATA_NEGATIVE_TTL = 86400
+    METADATA_MEMORY_SIZE = 4096
     CONTENT_WEIGHT = 0.7
     COLLABORATIVE_WEIGHT = 0.3
+    ANN_BACKEND = 'brute'
+    ANN_OPTIONS = {}
+    COLLABORATIVE_MODEL = 'knn'
+    ALS_FACTORS = 64
+    ALS_REGULARIZATION = 10.0
+    ALS_ITERATIONS = 10
+    USER_NEIGHBORS = 50
+    USER_MAX_CANDIDATES = 20000
+    BATCH_CHUNK_SIZE = 32
+    RESULT_CACHE_SIZE = 1024
+    RESULT_CACHE_TTL = 600
+    RESULT_CACHE_SHARED_PATH = None
+    RATINGS_COMPACT_THRESHOLD = 100000
+    RATINGS_LOG_PATH = "data/ratings_log.csv"
+    COLLABORATIVE_NEIGHBORS = 10
+    NEIGHBOR_TOP_K = 50
+    NEIGHBOR_INDEX_PATH = "data/item_neighbors"
+    MODEL_SNAPSHOT_PATH = "data/model_snapshot"
+    DATA_CHECKSUMS_PATH = "data/checksums.txt"
+    DATA_DIGEST_CACHE_PATH = "data/checksums_cache.json"
+    CONTENT_CACHE_SIZE = 256
+
+# Genres added to the user's own picks for each mood
+MOOD_GENRE_MAP = {
+    'Happy': ['Comedy', 'Adventure', 'Family', 'Musical'],
+    'Sad': ['Drama', 'Romance'],
+    'Adventurous': ['Action', 'Adventure', 'Sci-Fi', 'Thriller'],
+    'Relaxed': ['Comedy', 'Animation', 'Romance', 'Family']
+}
+
+
+def fit_genre_tfidf(genres):
+    """TF-IDF vectorizer and movie x term matrix over '|'-separated genre strings"""
+    tfidf = TfidfVectorizer(stop_words='english')
+    matrix = tfidf.fit_transform([str(g).replace('|', ' ') for g in genres])
+    return tfidf, matrix
+
+
+def _excluded_genres(*genres):
+    return lambda recommender: ~recommender.movies.genre_mask(genres)
+
+
+def _runtime_below(minutes):
+    def rule(recommender):
+        if 'runtime' not in recommender.movies.columns:
+            return np.ones(len(recommender.movie_ids), dtype=bool)
+        runtime = np.asarray(recommender.movies['runtime'], dtype=np.float64)
+        return runtime < minutes
+    return rule
+
+
+# Context filters: (user input field, value) -> rule building a boolean mask
+# over the catalog. Masks are materialized once at load time and combined
+# with a bitwise AND; registering a rule here is all a new filter needs.
+CONTEXT_RULES = {
+    ('occasion', 'Family'): _excluded_genres('Horror', 'Crime', 'Thriller'),
+    ('time_budget', '< 90 mins'): _runtime_below(90),
+    ('time_budget', '< 2 hours'): _runtime_below(120)
+}
 
 
 class MovieRecommender:
-    def __init__(self, movies_csv='data/movies_dataset.csv', ratings_csv='data/ratings_dataset.csv'):
-        """Initialize the recommendation engine"""
-        self.load_data(movies_csv, ratings_csv)
-        self.prepare_content_features()
-        self.prepare_collaborative_model()
+    def __init__(self, movies_csv='data/movies_dataset.csv', ratings_csv='data/ratings_dataset.csv',
+                 neighbor_index_path=NEIGHBOR_INDEX_PATH, snapshot_path=MODEL_SNAPSHOT_PATH, progress=None,
+                 build=True, ratings_log_path=RATINGS_LOG_PATH):
+        """
+        Initialize the recommendation engine.
+        
+        progress(phase) is called as each load phase starts. With
+        build=False the model is neither loaded nor built; the caller fills
+        it in (see build_model.py). Ratings in ratings_log_path (written by
+        add_ratings) that the snapshot does not hold yet are re-applied once
+        the model is loaded.
+        """
+        report = progress or (lambda phase: None)
+        # links.csv ids only describe the MovieLens catalog, not the dummy data
+        self.metadata = self.create_metadata_client(
+            use_links=os.path.exists(movies_csv) and os.path.exists(ratings_csv)
+        )
+        self.neighbor_index_path = neighbor_index_path
+        self.snapshot_path = snapshot_path
+        self.snapshot_key = snapshot.dataset_key(
+            [movies_csv, ratings_csv], DATA_CHECKSUMS_PATH,
+            extra=[NEIGHBOR_TOP_K, ANN_BACKEND, sorted(ANN_OPTIONS.items()), COLLABORATIVE_MODEL,
+                   ALS_FACTORS, ALS_REGULARIZATION, ALS_ITERATIONS],
+            digest_cache_path=DATA_DIGEST_CACHE_PATH
+        )
+        # Ratings added at runtime (see add_ratings)
+        self.pending_ratings = PendingRatings()
+        self.ratings_log = RatingsLog(ratings_log_path) if ratings_log_path else None
+        # Part of the log the model holds: folded into the snapshot up to
+        # offset (fold_id '' = built from the data files alone), then
+        # replayed up to log_position
+        self.log_state = {'offset': 0, 'prefix': None, 'fold_id': ''}
+        self.log_position = 0
+        self.log_digest = hashlib.md5(b'').hexdigest()
+        self.model_version = 0
+        self._worker_token = uuid.uuid4().hex[:12]
+        self._update_lock = threading.Lock()
+        
+        # Keyed on the snapshot key and the scoring settings, so a rebuilt or
+        # retuned model starts with an empty cache
+        self.ranking_key = hashlib.md5('|'.join(str(item) for item in [
+            self.snapshot_key, CONTENT_WEIGHT, COLLABORATIVE_WEIGHT, COLLABORATIVE_NEIGHBORS,
+            USER_NEIGHBORS, USER_MAX_CANDIDATES
+        ]).encode()).hexdigest()
+        self.result_cache = ResultCache(
+            RESULT_CACHE_SIZE, RESULT_CACHE_TTL, RESULT_CACHE_SHARED_PATH, namespace=self.ranking_key
+        )
+        if not build:
+            return
+        
+        # Workers starting together build the snapshot once; the rest wait
+        # for the lock and then attach to the files the first one wrote
+        report('waiting for build lock')
+        with snapshot.build_lock(snapshot_path):
+            report('loading snapshot')
+            if not (snapshot_path and self.load_snapshot(snapshot_path)):
+                report('loading data')
+                self.load_data(movies_csv, ratings_csv)
+                report('content features')
+                self.prepare_content_features()
+                report('collaborative model')
+                self.prepare_collaborative_model()
+                report('popularity')
+                self.prepare_popularity()
+                self.prepare_context_masks()
+                
+                report('saving snapshot')
+                if snapshot_path and self.save_snapshot(snapshot_path):
+                    # Serve from the memory-mapped snapshot like every other
+                    # worker, so the heap copies built above are released
+                    ingest_stats = self.ingest_stats
+                    self.load_snapshot(snapshot_path)
+                    self.ingest_stats = ingest_stats
+        
+        # Ratings logged after the snapshot was written come from the log
+        report('replaying ratings')
+        self.replay_ratings()
+    
+    def save_snapshot(self, path):
+        """Persist the fitted model so later starts can skip the build"""
+        arrays = {
+            'movie_ids': self.movie_ids,
+            'movie_pos': self.movie_pos,
+            'user_ids': self.user_ids,
+            'tfidf_idf': self.tfidf.idf_.astype(np.float64),
+            'neighbor_ids': self.neighbor_index.neighbor_ids,
+            'neighbor_similarities': self.neighbor_index.similarities,
+            'rating_counts': self.rating_counts,
+            'rating_means': self.rating_means,
+            'popularity': self.popularity,
+            'popular_cols': self.popular_cols
+        }
+        arrays.update(self.movies.to_arrays('catalog'))
+        if self.mf_model is not None:
+            arrays['als_item_factors'] = self.mf_model.item_factors
+        arrays.update(snapshot.sparse_to_arrays('tfidf', self.tfidf_matrix))
+        arrays.update(snapshot.sparse_to_arrays('user_item', self.user_item_matrix))
+        arrays.update(snapshot.sparse_to_arrays('item_user', self.item_user_matrix))
+        meta = {
+            'tfidf_vocabulary': {term: int(idx) for term, idx in self.tfidf.vocabulary_.items()},
+            'neighbor_fingerprint': self.neighbor_index.fingerprint,
+            'neighbor_engine': self.neighbor_index.engine,
+            'catalog': self.movies.layout,
+            'ratings_log': self.log_state
+        }
+        try:
+            snapshot.save_snapshot(path, self.snapshot_key, arrays, meta=meta)
+            print(f"✓ Saved model snapshot to {path}")
+            return True
+        except OSError as e:
+            print(f"⚠ Could not save model snapshot: {e}")
+            return False
+    
+    def load_snapshot(self, path):
+        """Load a saved model if it was built from the current data"""
+        start_time = time.time()
+        loaded = snapshot.load_snapshot(path, self.snapshot_key)
+        if loaded is None:
+            return False
+        arrays, meta = loaded
+        
+        self.movies = Catalog.from_arrays('catalog', arrays, meta['catalog'])
+        self.movie_ids = arrays['movie_ids']
+        self.movie_pos = arrays['movie_pos']
+        self.user_ids = arrays['user_ids']
+        self.ingest_stats = None
+        
+        self.tfidf = TfidfVectorizer(stop_words='english')
+        self.tfidf.vocabulary_ = meta['tfidf_vocabulary']
+        self.tfidf.idf_ = np.asarray(arrays['tfidf_idf'])
+        self.tfidf_matrix = snapshot.arrays_to_sparse('tfidf', arrays)
+        self.genre_index = GenreIndex(self.tfidf, self.tfidf_matrix, CONTENT_CACHE_SIZE)
+        
+        self.user_item_matrix = snapshot.arrays_to_sparse('user_item', arrays)
+        self.item_user_matrix = snapshot.arrays_to_sparse('item_user', arrays)
+        self.neighbor_index = ItemNeighborIndex(
+            arrays['neighbor_ids'], arrays['neighbor_similarities'],
+            self.movie_ids, meta['neighbor_fingerprint'], meta['neighbor_engine']
+        )
+        
+        self.mf_model = None
+        if 'als_item_factors' in arrays:
+            self.mf_model = ALSModel.from_factors(arrays['als_item_factors'], ALS_REGULARIZATION)
+        
+        self.rating_counts = arrays['rating_counts']
+        self.rating_means = arrays['rating_means']
+        self.popularity = arrays['popularity']
+        self.popular_cols = arrays['popular_cols']
+        self.prepare_context_masks()
+        self.log_state = meta.get('ratings_log', {'offset': 0, 'prefix': None, 'fold_id': ''})
+        
+        print(f"✓ Loaded model snapshot ({len(self.movies)} movies, {self.n_ratings} ratings) "
+              f"in {time.time() - start_time:.2f}s")
+        return True
         
     def load_data(self, movies_csv, ratings_csv):
-        """Load movie and ratings datasets"""
+        """Load the movie catalog and stream ratings into a sparse matrix"""
         try:
-            self.movies = pd.read_csv(movies_csv)
-            self.ratings = pd.read_csv(ratings_csv)
-            print(f"✓ Loaded {len(self.movies)} movies and {len(self.ratings)} ratings")
+            self.movies = Catalog.from_frame(pd.read_csv(movies_csv))
+            self.index_movies()
+            self.user_item_matrix, self.user_ids, self.ingest_stats = load_ratings_sparse(
+                ratings_csv, self.movie_columns, len(self.movie_ids)
+            )
+            print(f"✓ Loaded {len(self.movies)} movies and {self.n_ratings} ratings")
         except FileNotFoundError:
             print("⚠ Dataset not found. Creating dummy data...")
             self._create_dummy_data()
     
+    def index_movies(self):
+        """Build the movieId <-> column mapping for the catalog"""
+        # Rating matrix columns follow the row order of self.movies so every
+        # score vector lines up with the catalog; unrated movies are empty columns.
+        self.movie_ids = np.asarray(self.movies['movieId'], dtype=np.int32)
+        self.movie_pos = np.full(int(self.movie_ids.max()) + 1, -1, dtype=np.int32)
+        self.movie_pos[self.movie_ids] = np.arange(len(self.movie_ids), dtype=np.int32)
+    
+    @property
+    def n_ratings(self):
+        """Number of ratings held in the collaborative model"""
+        return int(self.user_item_matrix.nnz) + len(self.pending_ratings)
+    
     def _create_dummy_data(self):
         """Create dummy dataset for demonstration"""
-        self.movies = pd.DataFrame({
+        movies = pd.DataFrame({
             'movieId': range(1, 51),
             'title': [
                 'The Shawshank Redemption', 'The Godfather', 'The Dark Knight',
@@ -87,7 +345,7 @@ class MovieRecommender:
         })
         
         # Add overview/plot descriptions
-        self.movies['overview'] = [
+        movies['overview'] = [
             'Two imprisoned men bond over years, finding redemption through acts of decency.',
             'The aging patriarch of an organized crime dynasty transfers control to his reluctant son.',
             'When menace known as Joker emerges, Batman must accept one of greatest psychological tests.',
@@ -139,6 +397,7 @@ class MovieRecommender:
             'Two teenagers share a profound connection after discovering they are swapping bodies.',
             'Passengers on a train must fight for survival against a zombie outbreak.'
         ]
+        self.movies = Catalog.from_frame(movies)
         
         # Create dummy ratings
         np.random.seed(42)
@@ -150,248 +409,685 @@ class MovieRecommender:
                 rating = np.random.choice([1, 2, 3, 4, 5], p=[0.05, 0.1, 0.2, 0.35, 0.3])
                 ratings_data.append({'userId': user, 'movieId': int(movie_id), 'rating': float(rating)})
         
-        self.ratings = pd.DataFrame(ratings_data)
+        ratings = pd.DataFrame(ratings_data)
+        self.index_movies()
+        self.user_item_matrix, self.user_ids = ratings_to_sparse(
+            ratings['userId'].to_numpy(),
+            self.movie_columns(ratings['movieId'].to_numpy()),
+            ratings['rating'].to_numpy(),
+            len(self.movie_ids)
+        )
+        self.ingest_stats = None
     
     def prepare_content_features(self):
         """Prepare TF-IDF features for content-based filtering"""
-        self.movies['genres_clean'] = self.movies['genres'].str.replace('|', ' ')
-        self.tfidf = TfidfVectorizer(stop_words='english')
-        self.tfidf_matrix = self.tfidf.fit_transform(self.movies['genres_clean'])
+        self.tfidf, self.tfidf_matrix = fit_genre_tfidf(self.movies['genres'])
+        self.genre_index = GenreIndex(self.tfidf, self.tfidf_matrix, CONTENT_CACHE_SIZE)
     
     def prepare_collaborative_model(self):
-        """Prepare user-item matrix for collaborative filtering"""
-        self.user_item_matrix = self.ratings.pivot_table(
-            index='userId',
-            columns='movieId',
-            values='rating'
-        ).fillna(0)
+        """Prepare item-item structures over the sparse user-item matrix"""
+        # Item-major copy: one row per movie, used for item-item similarity
+        self.item_user_matrix = self.user_item_matrix.T.tocsr()
+        
+        # Top-K neighbors are precomputed once so requests never run a KNN search
+        self.neighbor_index = load_or_build_index(
+            self.item_user_matrix, self.movie_ids, self.neighbor_index_path,
+            k=NEIGHBOR_TOP_K, backend=ANN_BACKEND, options=ANN_OPTIONS
+        )
         
-        self.knn_model = NearestNeighbors(metric='cosine', algorithm='brute')
-        self.knn_model.fit(self.user_item_matrix.T)
+        # Optional matrix-factorization model; only item factors are kept
+        self.mf_model = None
+        if COLLABORATIVE_MODEL == 'als':
+            start_time = time.time()
+            self.mf_model = ALSModel(
+                factors=ALS_FACTORS, regularization=ALS_REGULARIZATION, iterations=ALS_ITERATIONS
+            ).fit(self.user_item_matrix)
+            self.mf_model.user_factors = None
+            print(f"✓ Trained ALS model ({ALS_FACTORS} factors) in {time.time() - start_time:.1f}s")
     
-    def content_based_score(self, user_preferences):
-        """Calculate content-based scores"""
-        selected_genres = user_preferences.get('genres', [])
-        mood = user_preferences.get('mood', '')
+    def prepare_popularity(self):
+        """Precompute per-movie rating stats and the popularity ranking"""
+        counts = self.user_item_matrix.getnnz(axis=0)
+        sums = np.asarray(self.user_item_matrix.sum(axis=0, dtype=np.float64)).ravel()
+        
+        self.rating_counts = counts.astype(np.int32)
+        self.rating_means = np.divide(
+            sums, counts, out=np.zeros(len(counts)), where=counts > 0
+        ).astype(np.float32)
+        self.popularity = (self.rating_means * np.log(counts + 1)).astype(np.float32)
+        self.rank_popular()
+    
+    def rank_popular(self):
+        """Order the popular list from the current popularity scores"""
+        # Columns of movies with enough ratings, most popular first
+        eligible = np.flatnonzero(self.rating_counts >= 5)
+        order = np.argsort(-self.popularity[eligible], kind='stable')
+        self.popular_cols = eligible[order].astype(np.int32)
+    
+    def user_rows(self, user_ids):
+        """Map userIds to rows of the user-item matrix, adding rows for new users"""
+        user_ids = np.asarray(user_ids, dtype=np.int32)
+        order = np.argsort(self.user_ids, kind='stable')
+        known_ids = self.user_ids[order]
+        pos = np.zeros(len(user_ids), dtype=np.int64)
+        found = np.zeros(len(user_ids), dtype=bool)
+        if len(known_ids):
+            pos = np.minimum(np.searchsorted(known_ids, user_ids), len(known_ids) - 1)
+            found = known_ids[pos] == user_ids
+        
+        rows = np.empty(len(user_ids), dtype=np.int32)
+        rows[found] = order[pos[found]]
+        new_ids, inverse = np.unique(user_ids[~found], return_inverse=True)
+        rows[~found] = len(self.user_ids) + inverse
+        if len(new_ids):
+            self.user_ids = np.concatenate([self.user_ids, new_ids]).astype(np.int32)
+        return rows
+    
+    def add_ratings(self, user_ids, movie_ids, ratings):
+        """
+        Add ratings without a rebuild.
+        
+        The ratings are appended to the ratings log first, then go into a
+        pending buffer; neighbor lists and popularity stats are refreshed
+        for the touched movies only. Every RATINGS_COMPACT_THRESHOLD
+        ratings the buffer is merged into the sparse matrices and the
+        model, with every logged rating, is written out as the snapshot
+        (see fold_ratings). Neighbor lists of untouched movies and ALS
+        factors are refreshed by the next full build.
+        
+        Updates are applied in this process only: other workers sharing the
+        snapshot see them after their next start, when they replay the log.
+        Returns a summary dict.
+        """
+        start_time = time.time()
+        movie_cols = self.movie_columns(movie_ids)
+        ratings = np.asarray(ratings, dtype=np.float32)
+        known = movie_cols >= 0
+        
+        with self._update_lock:
+            if self.ratings_log is not None and known.any():
+                self.ratings_log.append(np.asarray(user_ids)[known], np.asarray(movie_ids)[known], ratings[known])
+            n_users_before = len(self.user_ids)
+            touched = self._apply_ratings(np.asarray(user_ids)[known], movie_cols[known], ratings[known])
+            
+            compacted = len(self.pending_ratings) >= RATINGS_COMPACT_THRESHOLD
+            if compacted and self.ratings_log is not None and self.snapshot_path:
+                folded = self.fold_ratings()
+            else:
+                folded = False
+                if compacted:
+                    self.compact_ratings()
+            
+            # Rankings cached for the previous model are no longer valid. A
+            # fold leaves the model equal to the new snapshot; otherwise the
+            # updated model is this process's own, and so is its namespace
+            if not folded:
+                self.model_version += 1
+                self.result_cache.set_namespace(f'{self.ranking_key}:{self._worker_token}:{self.model_version}')
         
-        mood_genre_map = {
-            'Happy': ['Comedy', 'Adventure', 'Family', 'Musical'],
-            'Sad': ['Drama', 'Romance'],
-            'Adventurous': ['Action', 'Adventure', 'Sci-Fi', 'Thriller'],
-            'Relaxed': ['Comedy', 'Animation', 'Romance', 'Family']
+        return {
+            'added': int(known.sum()),
+            'unknown_movies': int((~known).sum()),
+            'new_users': len(self.user_ids) - n_users_before,
+            'touched_movies': len(touched),
+            'pending': len(self.pending_ratings),
+            'compacted': compacted,
+            'elapsed_ms': (time.time() - start_time) * 1000
         }
+    
+    def _apply_ratings(self, user_ids, cols, ratings, refresh=True):
+        """Buffer ratings of known movies and refresh those movies; returns their columns"""
+        user_rows = self.user_rows(user_ids)
+        self.pending_ratings.append(user_rows, cols, ratings)
+        touched = np.unique(cols)
+        if refresh and len(touched):
+            self._refresh_items(touched)
+        return touched
+    
+    def _apply_logged(self, logged, refresh=True):
+        """Apply ratings read from a RatingsLog; returns how many were applied"""
+        user_ids, movie_ids, ratings = logged[:3]
+        cols = self.movie_columns(movie_ids)
+        known = cols >= 0
+        self._apply_ratings(user_ids[known], cols[known], ratings[known], refresh)
+        return int(known.sum())
+    
+    def replay_ratings(self, refresh=True):
+        """
+        Re-apply the logged ratings the loaded snapshot does not hold.
         
-        if mood in mood_genre_map:
-            selected_genres = selected_genres + mood_genre_map[mood]
+        That is the log past the offset recorded when the snapshot was
+        written, or the whole log once it has been rotated. A model built
+        from the data files alone replays the archive of folded ratings
+        first. Workers replaying the same lines share one result-cache
+        namespace.
+        """
+        if self.ratings_log is None:
+            return
+        start_time = time.time()
+        state = self.log_state
+        with self._update_lock:
+            replayed, digests = 0, []
+            start = 0
+            if not state['fold_id']:
+                archived = self.ratings_log.archive.read()
+                replayed += self._apply_logged(archived, refresh)
+                digests.append(archived[4])
+            elif self.ratings_log.prefix_digest(state['offset']) == state['prefix']:
+                start = state['offset']
+            
+            logged = self.ratings_log.read(start)
+            replayed += self._apply_logged(logged, refresh)
+            self.log_position = logged[3]
+            digests.append(logged[4])
+            self.log_digest = digests[0] if len(digests) == 1 else hashlib.md5(''.join(digests).encode()).hexdigest()
+            self.result_cache.set_namespace(self.shared_namespace(), shared=True)
+        if replayed:
+            print(f"✓ Replayed {replayed:,} logged ratings in {time.time() - start_time:.1f}s")
+    
+    def shared_namespace(self):
+        """Result-cache namespace of the snapshot plus the replayed log, the same in every worker"""
+        return f"{self.ranking_key}:{self.log_state['fold_id']}:{self.log_digest}"
+    
+    def fold_ratings(self, force=False):
+        """
+        Compact the model and write it, with every logged rating, as the snapshot.
         
-        user_profile = ' '.join(selected_genres)
-        user_vector = self.tfidf.transform([user_profile])
-        similarities = cosine_similarity(user_vector, self.tfidf_matrix).flatten()
+        Ratings other workers logged since this one replayed the log are
+        applied first. The folded lines are then moved from the log to its
+        archive, so later starts replay only what is logged after them.
+        Unless force is set, nothing is written when another worker has
+        already replaced the snapshot this one was loaded from. Returns
+        True when the model now matches the written snapshot.
+        """
+        with snapshot.build_lock(self.snapshot_path):
+            manifest = snapshot.read_manifest(self.snapshot_path)
+            if not force and manifest is not None and manifest.get('key') == self.snapshot_key:
+                fold_id = manifest['meta'].get('ratings_log', {}).get('fold_id', '')
+                if fold_id != self.log_state['fold_id']:
+                    print("⚠ Model snapshot was updated by another worker, not folding ratings")
+                    self.compact_ratings()
+                    return False
+            
+            if self.ratings_log is not None:
+                logged = self.ratings_log.read(self.log_position)
+                self._apply_logged(logged)
+                self.log_position = logged[3]
+            self.compact_ratings()
+            
+            end = self.log_position
+            previous = self.log_state
+            self.log_state = {
+                'offset': end,
+                'prefix': self.ratings_log.prefix_digest(end) if self.ratings_log is not None else None,
+                'fold_id': uuid.uuid4().hex
+            }
+            if not self.save_snapshot(self.snapshot_path):
+                self.log_state = previous
+                return False
+            if self.ratings_log is not None:
+                self.ratings_log.rotate(end)
+            
+            # Serve from the new snapshot's memory maps, like a fresh start
+            ingest_stats = self.ingest_stats
+            self.load_snapshot(self.snapshot_path)
+            self.ingest_stats = ingest_stats
+        
+        self.log_digest = hashlib.md5(b'').hexdigest()
+        self.result_cache.set_namespace(self.shared_namespace(), shared=True)
+        return True
+    
+    def _refresh_items(self, cols, chunk_size=256):
+        """Recompute neighbor lists and popularity stats of some movies"""
+        n_users = len(self.user_ids)
+        if getattr(self, '_item_norms', None) is None:
+            self._item_norms = row_norms(self.item_user_matrix)
+        
+        # Snapshot and index arrays may be read-only memory maps; the first
+        # update copies them to the heap, later ones write in place
+        index = self.neighbor_index
+        for owner, name in ((self, 'rating_counts'), (self, 'rating_means'), (self, 'popularity'),
+                            (index, 'neighbor_ids'), (index, 'similarities')):
+            if not getattr(owner, name).flags.writeable:
+                setattr(owner, name, np.array(getattr(owner, name)))
+        
+        vectors = self.pending_ratings.item_vectors(self.item_user_matrix, cols, n_users)
+        counts = vectors.getnnz(axis=1)
+        sums = np.asarray(vectors.sum(axis=1), dtype=np.float64).ravel()
+        self.rating_counts[cols] = counts
+        self.rating_means[cols] = np.divide(sums, counts, out=np.zeros(len(cols)), where=counts > 0)
+        self.popularity[cols] = self.rating_means[cols] * np.log(counts + 1)
+        self.rank_popular()
+        
+        norms = row_norms(vectors)
+        self._item_norms[cols] = norms
+        all_norms = np.where(self._item_norms > 0, self._item_norms, 1.0)
         
-        return pd.Series(similarities, index=self.movies['movieId'].values)
+        # Other movies with pending ratings differ from their compacted rows
+        pending_cols = self.pending_ratings.touched_cols
+        pending_vectors = self.pending_ratings.item_vectors(self.item_user_matrix, pending_cols, n_users)
+        n_base_users = self.item_user_matrix.shape[1]
+        
+        for start in range(0, len(cols), chunk_size):
+            block = cols[start:start + chunk_size]
+            scale = 1.0 / np.where(norms[start:start + chunk_size] > 0, norms[start:start + chunk_size], 1.0)
+            unit = sp.diags(scale) @ vectors[start:start + chunk_size]
+            sims = (unit[:, :n_base_users] @ self.item_user_matrix.T).toarray()
+            sims[:, pending_cols] = (unit @ pending_vectors.T).toarray()
+            sims /= all_norms
+            ids, top_sims = topk_rows(sims, index.k, exclude=block)
+            index.neighbor_ids[block, :ids.shape[1]] = ids
+            index.similarities[block, :ids.shape[1]] = top_sims
+        
+        # Keep the batch scoring matrix in step with the refreshed rows
+        cached = getattr(self, '_neighbor_matrix', None)
+        if cached is not None and cached[0] is index:
+            matrix = cached[1]
+            neighbor_cols, similarities = self.neighbor_slots(cols)
+            width = neighbor_cols.shape[1]
+            slots = (cols[:, None].astype(np.int64) * width + np.arange(width)).ravel()
+            matrix.indices[slots] = neighbor_cols.ravel()
+            matrix.data[slots] = similarities.ravel()
+            matrix.has_sorted_indices = False
+    
+    def compact_ratings(self):
+        """Merge pending ratings into the sparse matrices"""
+        if len(self.pending_ratings) == 0:
+            return
+        start_time = time.time()
+        self.item_user_matrix = self.pending_ratings.compact(self.item_user_matrix, len(self.user_ids))
+        self.user_item_matrix = self.item_user_matrix.T.tocsr()
+        self.pending_ratings.clear()
+        print(f"✓ Compacted ratings into the model ({self.user_item_matrix.nnz:,} ratings) "
+              f"in {time.time() - start_time:.1f}s")
+    
+    def movie_columns(self, movie_ids):
+        """Map movieIds to matrix columns (-1 for movies not in the catalog)"""
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        columns = np.full(movie_ids.shape, -1, dtype=np.int32)
+        in_range = (movie_ids >= 0) & (movie_ids < len(self.movie_pos))
+        columns[in_range] = self.movie_pos[movie_ids[in_range]]
+        return columns
+    
+    def user_genres(self, user_preferences):
+        """Selected genres plus the genres implied by the mood"""
+        selected_genres = list(user_preferences.get('genres', []))
+        mood = user_preferences.get('mood', '')
+        
+        if mood in MOOD_GENRE_MAP:
+            selected_genres = selected_genres + MOOD_GENRE_MAP[mood]
+        return selected_genres
+    
+    def content_based_score(self, user_preferences):
+        """Calculate content-based scores, one per row of self.movies"""
+        # Memoized per genre multiset; the returned array is read-only
+        return self.genre_index.score(self.user_genres(user_preferences))
     
     def collaborative_score(self, seed_ratings):
-        """Calculate collaborative filtering scores"""
+        """Calculate collaborative filtering scores, one per row of self.movies"""
         if not seed_ratings:
-            return pd.Series(dtype=float)
+            return np.zeros(len(self.movie_ids))
+        if self.mf_model is not None:
+            return self.mf_score(seed_ratings)
+        if COLLABORATIVE_MODEL == 'user':
+            return self.user_score(seed_ratings)
         
-        user_vector = pd.Series(0.0, index=self.user_item_matrix.columns)
-        for movie_id, rating in seed_ratings.items():
-            if movie_id in user_vector.index:
-                user_vector[movie_id] = float(rating)
+        seed_cols = self.movie_columns(list(seed_ratings.keys()))
+        seed_values = np.array([float(r) for r in seed_ratings.values()])
+        active = (seed_cols >= 0) & (seed_values > 0)
         
-        scores = {}
-        for movie_id in user_vector[user_vector > 0].index:
-            if movie_id not in self.user_item_matrix.columns:
-                continue
-                
-            movie_idx = list(self.user_item_matrix.columns).index(movie_id)
-            
-            try:
-                distances, indices = self.knn_model.kneighbors(
-                    self.user_item_matrix.T.iloc[movie_idx].values.reshape(1, -1),
-                    n_neighbors=min(11, len(self.user_item_matrix.columns))
-                )
-                
-                for i, idx in enumerate(indices.flatten()[1:]):
-                    similar_movie_id = self.user_item_matrix.columns[idx]
-                    if similar_movie_id not in seed_ratings:
-                        similarity = 1 - distances.flatten()[i+1]
-                        scores[similar_movie_id] = scores.get(similar_movie_id, 0.0) + (
-                            similarity * user_vector[movie_id]
-                        )
-            except Exception as e:
-                print(f"Warning: Error in collaborative filtering for movie {movie_id}: {e}")
-                continue
+        # One gather for all seeds: (n_seeds, k) neighbor columns and weights
+        neighbor_cols = self.neighbor_index.neighbor_ids[seed_cols[active], :COLLABORATIVE_NEIGHBORS]
+        weights = (
+            self.neighbor_index.similarities[seed_cols[active], :COLLABORATIVE_NEIGHBORS] *
+            seed_values[active, None]
+        )
+        valid = neighbor_cols >= 0
+        scores = np.bincount(
+            neighbor_cols[valid], weights=weights[valid], minlength=len(self.movie_ids)
+        )
         
-        return pd.Series(scores, dtype=float)
+        # Seed movies are never recommended back
+        scores[seed_cols[seed_cols >= 0]] = 0.0
+        return scores
     
-    def apply_contextual_filters(self, recommendations, context):
-        """Apply contextual filters"""
-        filtered = recommendations.copy()
+    def mf_score(self, seed_ratings):
+        """Matrix-factorization scores: fold the seeds in, then score every movie"""
+        seed_cols = self.movie_columns(list(seed_ratings.keys()))
+        seed_values = np.array([float(r) for r in seed_ratings.values()])
+        known = seed_cols >= 0
+        if not known.any():
+            return np.zeros(len(self.movie_ids))
         
-        occasion = context.get('occasion', '')
-        if occasion == 'Family':
-            filtered = filtered[~filtered['genres'].str.contains('Horror|Crime|Thriller', na=False, case=False)]
+        user_vector = self.mf_model.fold_in(seed_cols[known], seed_values[known])
+        scores = np.maximum(self.mf_model.score(user_vector), 0.0).astype(np.float64)
         
-        time_budget = context.get('time_budget', 'No limit')
-        if time_budget == '< 90 mins':
-            filtered = filtered[filtered['runtime'] < 90]
-        elif time_budget == '< 2 hours':
-            filtered = filtered[filtered['runtime'] < 120]
+        # Seed movies are never recommended back
+        scores[seed_cols[known]] = 0.0
+        return scores
+    
+    def user_score(self, seed_ratings):
+        """User-user scores from the users most similar to the seed ratings"""
+        seed_cols = self.movie_columns(list(seed_ratings.keys()))
+        seed_values = np.array([float(r) for r in seed_ratings.values()])
+        active = (seed_cols >= 0) & (seed_values > 0)
+        if not active.any():
+            return np.zeros(len(self.movie_ids))
         
-        return filtered
+        scores = self.user_index().score(seed_cols[active], seed_values[active])
+        
+        # Seed movies are never recommended back
+        scores[seed_cols[seed_cols >= 0]] = 0.0
+        return scores
     
-    def get_recommendations(self, user_input, n=10):
+    def user_index(self):
+        """User-user index over the current (compacted) rating matrices"""
+        cached = getattr(self, '_user_index', None)
+        if cached is not None and cached.user_item_matrix is self.user_item_matrix:
+            return cached
+        self._user_index = UserNeighborIndex(
+            self.user_item_matrix, self.item_user_matrix, USER_NEIGHBORS, USER_MAX_CANDIDATES
+        )
+        return self._user_index
+    
+    def neighbor_slots(self, cols):
+        """Neighbor columns and weights of some movies, COLLABORATIVE_NEIGHBORS slots each"""
+        cols = np.asarray(cols)
+        neighbor_cols = np.asarray(self.neighbor_index.neighbor_ids[cols, :COLLABORATIVE_NEIGHBORS])
+        similarities = np.asarray(self.neighbor_index.similarities[cols, :COLLABORATIVE_NEIGHBORS])
+        # Empty slots point back at the movie itself with weight 0
+        missing = neighbor_cols < 0
+        neighbor_cols = np.where(missing, cols[:, None], neighbor_cols).astype(np.int32)
+        similarities = np.where(missing, 0.0, similarities).astype(np.float32)
+        return neighbor_cols, similarities
+    
+    def neighbor_matrix(self):
+        """Sparse movies x movies matrix of the neighbor weights used for scoring"""
+        cached = getattr(self, '_neighbor_matrix', None)
+        if cached is not None and cached[0] is self.neighbor_index:
+            return cached[1]
+        
+        # Every row has the same number of slots, so _refresh_items can
+        # rewrite a movie's row in place
+        n_movies = len(self.movie_ids)
+        neighbor_cols, similarities = self.neighbor_slots(np.arange(n_movies))
+        width = neighbor_cols.shape[1]
+        matrix = sp.csr_matrix(
+            (similarities.ravel(), neighbor_cols.ravel(), np.arange(0, n_movies * width + 1, width)),
+            shape=(n_movies, n_movies)
+        )
+        self._neighbor_matrix = (self.neighbor_index, matrix)
+        return matrix
+    
+    def seed_matrix(self, seed_ratings_list):
+        """Stack seed ratings into a sparse users x movies matrix"""
+        rows, cols, values = [], [], []
+        for row, seed_ratings in enumerate(seed_ratings_list):
+            seed_cols = self.movie_columns(list(seed_ratings.keys()))
+            known = seed_cols >= 0
+            rows.extend([row] * int(known.sum()))
+            cols.extend(seed_cols[known].tolist())
+            values.extend(float(r) for r, k in zip(seed_ratings.values(), known) if k)
+        return sp.csr_matrix(
+            (np.array(values, dtype=np.float32), (np.array(rows, dtype=np.int32), np.array(cols, dtype=np.int32))),
+            shape=(len(seed_ratings_list), len(self.movie_ids))
+        )
+    
+    def collaborative_score_batch(self, seeds):
+        """Collaborative scores for a users x movies seed matrix, one float32 row per user"""
+        if self.mf_model is not None:
+            user_vectors = self.mf_model.fold_in_many(seeds).astype(np.float32)
+            scores = np.maximum(user_vectors @ self.mf_model.item_factors.T, 0.0)
+        elif COLLABORATIVE_MODEL == 'user':
+            # Neighborhoods differ per user, so rows are scored one at a time
+            index = self.user_index()
+            scores = np.zeros(seeds.shape, dtype=np.float32)
+            for row in range(seeds.shape[0]):
+                seed_row = seeds.getrow(row)
+                positive = seed_row.data > 0
+                if positive.any():
+                    scores[row] = index.score(seed_row.indices[positive], seed_row.data[positive])
+        else:
+            positive = seeds.multiply(seeds > 0).tocsr()
+            scores = (positive @ self.neighbor_matrix()).toarray()
+        
+        # Seed movies are never recommended back
+        scores[seeds.nonzero()] = 0.0
+        return scores
+    
+    def prepare_context_masks(self):
+        """Materialize every registered context rule as a packed bitmap over the catalog"""
+        self.context_masks = {key: np.packbits(rule(self)) for key, rule in CONTEXT_RULES.items()}
+    
+    def context_mask(self, context):
+        """Boolean mask of catalog rows allowed by a context (AND of the registered masks)"""
+        bits = None
+        for field, value in context.items():
+            mask = self.context_masks.get((field, value))
+            if mask is not None:
+                bits = mask if bits is None else bits & mask
+        if bits is None:
+            return np.ones(len(self.movie_ids), dtype=bool)
+        return np.unpackbits(bits, count=len(self.movie_ids)).view(bool)
+    
+    def apply_contextual_filters(self, recommendations, context):
+        """Apply contextual filters"""
+        cols = self.movie_columns(recommendations['movieId'].to_numpy())
+        allowed = self.context_mask(context)
+        return recommendations[(cols >= 0) & allowed[cols]].copy()
+    
+    def top_columns(self, scores, eligible, n):
+        """Catalog rows of the n best positive scores among eligible movies, best first"""
+        # Only scored movies are ranked, so the selection never spans the full catalog
+        candidates = np.flatnonzero(eligible & (scores > 0))
+        if n <= 0:
+            return candidates[:0]
+        if len(candidates) > n:
+            candidates = candidates[np.argpartition(-scores[candidates], n - 1)[:n]]
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
+    
+    def fill_columns(self, columns, eligible, n):
+        """Pad a ranked list to n rows with the most popular eligible movies"""
+        if len(columns) >= n:
+            return columns
+        taken = np.zeros(len(eligible), dtype=bool)
+        taken[columns] = True
+        popular = self.popular_cols[eligible[self.popular_cols] & ~taken[self.popular_cols]]
+        columns = np.concatenate([columns, popular[:n - len(columns)]])
+        if len(columns) < n:
+            # Rarely rated movies come last, in catalog order
+            taken[columns] = True
+            columns = np.concatenate([columns, np.flatnonzero(eligible & ~taken)[:n - len(columns)]])
+        return columns.astype(np.int64)
+    
+    def rank_recommendations(self, user_input, n=10):
         """
-        Main recommendation function - FIXED VERSION
+        Ranked catalog rows and their hybrid scores for one user.
+        
+        Scores stay in catalog-aligned NumPy arrays: context filters and
+        already-rated movies are masked out before the top-N selection, so
+        filtering never shrinks the list.
         """
-        try:
-            # Content-based scores
+        # Content-based scores
+        with metrics.timer('single', 'content'):
             content_scores = self.content_based_score({
                 'genres': user_input.get('genres', []),
                 'mood': user_input.get('mood', '')
             })
-            
-            # Collaborative scores
-            collab_scores = self.collaborative_score(user_input.get('seed_ratings', {}))
-            
+        
+        # Collaborative scores
+        seed_ratings = user_input.get('seed_ratings', {})
+        with metrics.timer('single', 'collaborative'):
+            collab_scores = self.collaborative_score(seed_ratings)
+        
+        with metrics.timer('single', 'blend'):
             # Normalize scores
-            if len(content_scores) > 0 and content_scores.sum() > 0:
+            if content_scores.sum() > 0:
                 content_scores = content_scores / content_scores.max()
-            else:
-                content_scores = pd.Series(0.0, index=self.movies['movieId'].values)
             
-            if len(collab_scores) > 0 and collab_scores.sum() > 0:
+            if collab_scores.sum() > 0:
                 collab_scores = collab_scores / collab_scores.max()
-            else:
-                collab_scores = pd.Series(0.0, index=self.movies['movieId'].values)
-            
-            # Combine scores (weighted hybrid)
-            combined_scores = (
-                CONTENT_WEIGHT * content_scores +
-                COLLABORATIVE_WEIGHT * collab_scores.reindex(content_scores.index, fill_value=0.0)
-            )
-            
-            # CRITICAL FIX: Ensure all values are numeric
-            combined_scores = pd.to_numeric(combined_scores, errors='coerce').fillna(0.0)
-            
-            # Remove already rated movies
-            rated_movies = set(user_input.get('seed_ratings', {}).keys())
-            combined_scores = combined_scores[~combined_scores.index.isin(rated_movies)]
-            
-            # Check if we have any valid scores
-            if len(combined_scores) == 0 or combined_scores.sum() == 0:
-                print("⚠️ No scores generated, returning popular movies as fallback")
-                return self.get_popular_movies_for_seeding(n)
-            
-            # Get top movies - ensure we don't request more than available
-            n_movies = min(n * 3, len(combined_scores))
-            top_movie_ids = combined_scores.nlargest(n_movies).index
             
-            recommendations = self.movies[self.movies['movieId'].isin(top_movie_ids)].copy()
-            recommendations['score'] = recommendations['movieId'].map(combined_scores).fillna(0.0)
-            recommendations = recommendations.sort_values('score', ascending=False)
-            
-            # Apply contextual filters
-            recommendations = self.apply_contextual_filters(
-                recommendations,
-                {
-                    'occasion': user_input.get('occasion', ''),
-                    'time_budget': user_input.get('time_budget', '')
-                }
-            )
+            # Combine scores (weighted hybrid); both are aligned to self.movies rows
+            combined_scores = CONTENT_WEIGHT * content_scores + COLLABORATIVE_WEIGHT * collab_scores
+            combined_scores = np.nan_to_num(combined_scores, nan=0.0)
+        
+        # Context filters and already rated movies, as one mask
+        with metrics.timer('single', 'context'):
+            eligible = self.context_mask({
+                'occasion': user_input.get('occasion', ''),
+                'time_budget': user_input.get('time_budget', '')
+            })
+            seed_cols = self.movie_columns(list(seed_ratings.keys()))
+            eligible[seed_cols[seed_cols >= 0]] = False
+        
+        with metrics.timer('single', 'top_n'):
+            top_cols = self.top_columns(combined_scores, eligible, n)
+            if len(top_cols) == 0:
+                # Nothing scored, the list is all popular movies
+                metrics.POPULAR_FALLBACKS.inc(reason='no_scores')
+            top_cols = self.fill_columns(top_cols, eligible, n)
+        return top_cols, combined_scores[top_cols]
+    
+    def get_recommendations(self, user_input, n=10):
+        """
+        Main recommendation function.
+        
+        Rankings are cached per canonical user input (see result_cache.py);
+        only the final N rows are materialized from the catalog.
+        """
+        metrics.RECOMMENDATIONS.inc(path='single')
+        try:
+            key = canonical_key(user_input, n)
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                metrics.RESULT_CACHE_LOOKUPS.inc(result='hit')
+                top_cols, scores = cached
+            else:
+                metrics.RESULT_CACHE_LOOKUPS.inc(result='miss')
+                top_cols, scores = self.rank_recommendations(user_input, n)
+                self.result_cache.put(key, top_cols, scores)
             
             # Ensure we have recommendations after filtering
-            if len(recommendations) == 0:
-                print("⚠️ No recommendations after filtering, returning popular movies")
+            if len(top_cols) == 0:
+                metrics.POPULAR_FALLBACKS.inc(reason='no_results')
                 return self.get_popular_movies_for_seeding(n)
             
-            return recommendations.head(n)
+            recommendations = self.movies.frame(top_cols)
+            recommendations['score'] = scores
+            return recommendations
         
         except Exception as e:
+            metrics.POPULAR_FALLBACKS.inc(reason='error')
             print(f"❌ Error in get_recommendations: {e}")
             import traceback
             traceback.print_exc()
             print("📊 Falling back to popular movies")
             return self.get_popular_movies_for_seeding(n)
     
+    def get_recommendations_batch(self, user_inputs, n=10):
+        """
+        Recommendations for many users at once, one DataFrame per user.
+        
+        Users are scored in chunks of BATCH_CHUNK_SIZE as float32 users x
+        movies blocks: collaborative scores are one sparse matrix product,
+        content scores reuse the memoized per-genre vectors, and each row's
+        top-N only ranks the movies it actually scored.
+        """
+        metrics.RECOMMENDATIONS.inc(len(user_inputs), path='batch')
+        results = []
+        for start in range(0, len(user_inputs), BATCH_CHUNK_SIZE):
+            results.extend(self._recommend_chunk(user_inputs[start:start + BATCH_CHUNK_SIZE], n))
+        return results
+    
+    def _recommend_chunk(self, user_inputs, n):
+        # One C-contiguous float32 block holds the blended scores; each row is
+        # the weighted content scores (max 1) plus the weighted collab scores
+        with metrics.timer('batch', 'content'):
+            combined = np.zeros((len(user_inputs), len(self.movie_ids)), dtype=np.float32)
+            for row, user_input in enumerate(user_inputs):
+                content_scores = self.content_based_score(user_input)
+                top = content_scores.max() if len(content_scores) else 0.0
+                if top > 0:
+                    np.multiply(content_scores, CONTENT_WEIGHT / top, out=combined[row], casting='unsafe')
+        
+        with metrics.timer('batch', 'collaborative'):
+            seeds = self.seed_matrix([user_input.get('seed_ratings', {}) for user_input in user_inputs])
+            collab_scores = self.collaborative_score_batch(seeds)
+        
+        # Per-row max normalization; rows without any signal stay zero
+        with metrics.timer('batch', 'blend'):
+            row_max = collab_scores.max(axis=1)
+            scale = np.divide(COLLABORATIVE_WEIGHT, row_max, out=np.zeros_like(row_max), where=row_max > 0)
+            collab_scores *= scale[:, None]
+            combined += collab_scores
+            del collab_scores
+        
+        # Context masks are shared by users with the same occasion/time budget
+        with metrics.timer('batch', 'context'):
+            masks = {}
+            row_masks = []
+            for user_input in user_inputs:
+                key = (user_input.get('occasion', ''), user_input.get('time_budget', ''))
+                if key not in masks:
+                    masks[key] = self.context_mask({'occasion': key[0], 'time_budget': key[1]})
+                row_masks.append(masks[key])
+        
+        with metrics.timer('batch', 'top_n'):
+            ranked = []
+            for row, mask in enumerate(row_masks):
+                eligible = mask.copy()
+                eligible[seeds.indices[seeds.indptr[row]:seeds.indptr[row + 1]]] = False
+                ranked.append(self.fill_columns(self.top_columns(combined[row], eligible, n), eligible, n))
+        
+        results = []
+        for row, top_cols in enumerate(ranked):
+            if len(top_cols) == 0:
+                metrics.POPULAR_FALLBACKS.inc(reason='no_results')
+                results.append(self.get_popular_movies_for_seeding(n))
+                continue
+            recommendations = self.movies.frame(top_cols)
+            recommendations['score'] = combined[row, top_cols].astype(np.float64)
+            results.append(recommendations)
+        return results
+    
     def get_popular_movies_for_seeding(self, n=10):
         """Get popular movies for seed rating step"""
-        movie_stats = self.ratings.groupby('movieId').agg({
-            'rating': ['mean', 'count']
-        }).reset_index()
-        movie_stats.columns = ['movieId', 'avg_rating', 'count']
-        movie_stats = movie_stats[movie_stats['count'] >= 5]
-        movie_stats['popularity'] = movie_stats['avg_rating'] * np.log(movie_stats['count'] + 1)
-        
-        top_movies = movie_stats.nlargest(min(n, len(movie_stats)), 'popularity')
-        result = self.movies[self.movies['movieId'].isin(top_movies['movieId'])]
-        return result.head(n)
-    
-    def fetch_movie_details(self, movie_title):
-        """Fetch movie details using configured API"""
+        top_cols = self.popular_cols[:n]
+        return self.movies.frame(np.sort(top_cols))
+    
+    @staticmethod
+    def create_metadata_client(use_links=True, max_workers=API_MAX_WORKERS):
+        """Metadata client for the API selected in config.py"""
         if USE_NO_API:
-            return None
+            return MetadataClient(None, None, None)
         
         if USE_OMDB and OMDB_API_KEY != "YOUR_OMDB_KEY_HERE":
-            return self.fetch_omdb_details(movie_title)
+            provider, api_key, base_url = 'omdb', OMDB_API_KEY, OMDB_BASE_URL
+        elif USE_TMDB and TMDB_API_KEY != "YOUR_TMDB_KEY_HERE":
+            provider, api_key, base_url = 'tmdb', TMDB_API_KEY, TMDB_BASE_URL
+        else:
+            return MetadataClient(None, None, None)
         
-        if USE_TMDB and TMDB_API_KEY != "YOUR_TMDB_KEY_HERE":
-            return self.fetch_tmdb_details(movie_title)
-        
-        return None
+        store = None
+        if METADATA_CACHE_PATH:
+            store = MetadataStore(METADATA_CACHE_PATH, METADATA_TTL, METADATA_NEGATIVE_TTL, METADATA_MEMORY_SIZE)
+        links = read_links(LINKS_PATH) if use_links else {}
+        return MetadataClient(provider, api_key, base_url, API_TIMEOUT, max_workers, store, links)
+    
+    def fetch_movie_details(self, movie_title, movie_id=None):
+        """Fetch movie details using configured API (cached per movieId)"""
+        return self.metadata.fetch(movie_title, movie_id)
+    
+    def fetch_movie_details_many(self, movie_titles, movie_ids=None, deadline=API_PAGE_DEADLINE):
+        """Fetch details for a page of movies concurrently (None where unavailable)"""
+        with metrics.timer('single', 'metadata'):
+            return self.metadata.fetch_many(movie_titles, deadline, movie_ids)
     
     def fetch_omdb_details(self, movie_title):
         """Fetch movie details from OMDb API"""
-        try:
-            clean_title = movie_title.split('(')[0].strip()
-            url = "http://www.omdbapi.com/"
-            params = {
-                'apikey': OMDB_API_KEY,
-                't': clean_title,
-                'type': 'movie',
-                'plot': 'short'
-            }
-            
-            response = requests.get(url, params=params, timeout=5)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('Response') == 'True':
-                    return {
-                        'poster_url': data.get('Poster', '') if data.get('Poster') != 'N/A' else None,
-                        'overview': data.get('Plot', 'No description available.'),
-                        'release_date': data.get('Released', ''),
-                        'vote_average': float(data.get('imdbRating', 0)) if data.get('imdbRating', 'N/A') != 'N/A' else 0,
-                        'director': data.get('Director', ''),
-                        'actors': data.get('Actors', ''),
-                        'imdb_rating': data.get('imdbRating', 'N/A')
-                    }
-        except Exception as e:
-            print(f"OMDb API Error for '{movie_title}': {e}")
-        
-        return None
+        return self.metadata.fetch_omdb(movie_title)
     
     def fetch_tmdb_details(self, movie_title):
         """Fetch movie details from TMDB API"""
-        try:
-            search_url = f"{TMDB_BASE_URL}/search/movie"
-            params = {'api_key': TMDB_API_KEY, 'query': movie_title}
-            response = requests.get(search_url, params=params, timeout=5)
-            
-            if response.status_code == 200:
-                results = response.json().get('results', [])
-                if results:
-                    movie = results[0]
-                    return {
-                        'poster_url': f"https://image.tmdb.org/t/p/w500{movie.get('poster_path', '')}" if movie.get('poster_path') else None,
-                        'overview': movie.get('overview', 'No description available.'),
-                        'release_date': movie.get('release_date', ''),
-                        'vote_average': movie.get('vote_average', 0)
-                    }
-        except Exception as e:
-            print(f"TMDB API Error for '{movie_title}': {e}")
-        
-
-        return None
+        return self.metadata.fetch_tmdb(movie_title)
@@ -0,0 +1,163 @@
+"""
+Cache of ranked recommendation lists.
+
+Sessions often submit the same genres, mood, context and popular seed
+movies, so the ranked catalog rows for a request are cached under a
+canonical hash of the user input. Entries live in a bounded in-process LRU
+with a TTL and, optionally, in a SQLite file shared by every worker on the
+machine. All entries belong to a namespace (the model snapshot key and
+the ratings replayed on top of it), so a new model never serves lists
+ranked by the old one. A worker that updates its model moves to a
+namespace of its own and only ever deletes that one; shared namespaces
+expire through the TTL.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def canonical_key(user_input, n):
+    """Stable hash of everything in the user input that affects the ranking"""
+    seed_ratings = user_input.get('seed_ratings', {}) or {}
+    canonical = {
+        'genres': sorted(str(g) for g in user_input.get('genres', []) or []),
+        'mood': user_input.get('mood', '') or '',
+        'occasion': user_input.get('occasion', '') or '',
+        'time_budget': user_input.get('time_budget', '') or '',
+        'seed_ratings': sorted((int(k), float(v)) for k, v in seed_ratings.items()),
+        'n': int(n)
+    }
+    return hashlib.sha1(json.dumps(canonical, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    """LRU+TTL cache of (catalog rows, scores) per canonical user-input key"""
+
+    def __init__(self, maxsize=1024, ttl=600, shared_path=None, namespace=''):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.namespace = namespace
+        self._private = False
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._conn = None
+        if shared_path:
+            if os.path.dirname(shared_path):
+                os.makedirs(os.path.dirname(shared_path), exist_ok=True)
+            self._conn = sqlite3.connect(shared_path, check_same_thread=False, timeout=5)
+            with self._lock:
+                self._conn.execute('PRAGMA journal_mode=WAL')
+                self._conn.execute('PRAGMA synchronous=NORMAL')
+                self._conn.execute(
+                    'CREATE TABLE IF NOT EXISTS results ('
+                    ' namespace TEXT NOT NULL,'
+                    ' key TEXT NOT NULL,'
+                    ' created REAL NOT NULL,'
+                    ' columns TEXT NOT NULL,'
+                    ' scores TEXT NOT NULL,'
+                    ' PRIMARY KEY (namespace, key))'
+                )
+                self._conn.commit()
+
+    def set_namespace(self, namespace, shared=False):
+        """
+        Switch to a new model; entries of the previous one are dropped.
+
+        shared=True marks a namespace other workers serve as well; its
+        entries are left to the TTL when this worker moves on.
+        """
+        with self._lock:
+            if namespace == self.namespace:
+                return
+            previous, self.namespace = self.namespace, namespace
+            was_private, self._private = self._private, not shared
+            self._entries.clear()
+            # Other workers still serve the namespaces they share with this one
+            if self._conn is not None and was_private:
+                self._conn.execute('DELETE FROM results WHERE namespace = ?', (previous,))
+                self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._conn is not None:
+                self._conn.execute('DELETE FROM results WHERE namespace = ?', (self.namespace,))
+                self._conn.commit()
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        """(columns, scores) for a fresh entry, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], entry[2]
+            if entry is not None:
+                del self._entries[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    'SELECT created, columns, scores FROM results WHERE namespace = ? AND key = ?',
+                    (self.namespace, key)
+                ).fetchone()
+                if row is not None and now - row[0] < self.ttl:
+                    entry = (
+                        row[0],
+                        np.array(json.loads(row[1]), dtype=np.int64),
+                        np.array(json.loads(row[2]), dtype=np.float64)
+                    )
+                    self._remember(key, entry)
+                    self.hits += 1
+                    self.shared_hits += 1
+                    return entry[1], entry[2]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, columns, scores):
+        now = time.time()
+        columns = np.asarray(columns, dtype=np.int64)
+        scores = np.asarray(scores, dtype=np.float64)
+        with self._lock:
+            self._remember(key, (now, columns, scores))
+            if self._conn is None:
+                return
+            self._conn.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                (self.namespace, key, now, json.dumps(columns.tolist()), json.dumps(scores.tolist()))
+            )
+            self._puts += 1
+            if self._puts % 256 == 0:
+                # Expired rows are pruned now and then rather than on every write
+                self._conn.execute('DELETE FROM results WHERE created < ?', (now - self.ttl,))
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'shared_hits': self.shared_hits,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'shared': self._conn is not None
+            }
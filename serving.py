@@ -0,0 +1,161 @@
+"""
+Background model loading for the web app.
+
+The recommender is built (or loaded from its snapshot) on a background
+thread so the server binds immediately. Until it is ready, requests are
+answered from a small popularity list saved by the previous run, so a
+rolling restart keeps serving traffic. The load moves through the states
+
+    loading -> ready        the model is serving
+    loading -> degraded     the build failed; only the fallback is served
+
+and records the time spent in each load phase.
+"""
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+LOADING = 'loading'
+READY = 'ready'
+DEGRADED = 'degraded'
+
+FALLBACK_COLUMNS = ['movieId', 'title', 'genres', 'year', 'rating', 'runtime', 'overview', 'score']
+
+
+def read_fallback(path):
+    """Popular movies saved by the last ready model (empty if there are none)"""
+    try:
+        with open(path) as f:
+            return pd.DataFrame(json.load(f))
+    except (OSError, ValueError):
+        return pd.DataFrame(columns=['movieId', 'title', 'genres'])
+
+
+def popular_fallback(recommender, n):
+    """The n most popular movies, scored by popularity relative to the top one"""
+    cols = recommender.popular_cols[:n]
+    movies = recommender.movies.frame(cols)
+    popularity = np.asarray(recommender.popularity[cols], dtype=np.float64)
+    movies['score'] = popularity / popularity.max() if len(cols) and popularity.max() > 0 else 0.0
+    return movies
+
+
+def write_fallback(path, movies):
+    """Save popular movies for the next start, atomically"""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    columns = [c for c in FALLBACK_COLUMNS if c in movies.columns]
+    staging = f'{path}.tmp'
+    with open(staging, 'w') as f:
+        f.write(movies[columns].to_json(orient='records'))
+    os.replace(staging, path)
+
+
+class ModelServer:
+    """Owns the recommender, its load state and the popularity fallback"""
+
+    def __init__(self, factory, fallback_path, fallback_size=50):
+        self.factory = factory
+        self.fallback_path = fallback_path
+        self.fallback_size = fallback_size
+        self.fallback = read_fallback(fallback_path)
+        self.recommender = None
+        self.state = LOADING
+        self.error = None
+        self.phase = 'starting'
+        self.phases = []
+        self.started = time.time()
+        self.finished = None
+        self._phase_start = self.started
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    def start(self):
+        """Load the model on a daemon thread"""
+        thread = threading.Thread(target=self._load, name='model-loader', daemon=True)
+        thread.start()
+        return thread
+
+    def enter_phase(self, phase):
+        """Progress callback for MovieRecommender: close the running phase, start the next"""
+        now = time.time()
+        with self._lock:
+            self.phases.append({'phase': self.phase, 'seconds': now - self._phase_start})
+            self.phase = phase
+            self._phase_start = now
+
+    def _load(self):
+        try:
+            recommender = self.factory(progress=self.enter_phase)
+        except Exception as e:
+            self.enter_phase(DEGRADED)
+            self.error = str(e)
+            self.state = DEGRADED
+            self.finished = time.time()
+            print(f"❌ Model failed to load, serving popular movies only: {e}")
+            return
+
+        try:
+            write_fallback(self.fallback_path, popular_fallback(recommender, self.fallback_size))
+        except OSError as e:
+            print(f"⚠ Could not save popularity fallback: {e}")
+
+        self.enter_phase(READY)
+        self.recommender = recommender
+        self.state = READY
+        self.finished = time.time()
+        print(f"✓ Model ready in {self.finished - self.started:.1f}s")
+
+    def popular_movies(self, n=10):
+        if self.ready:
+            return self.recommender.get_popular_movies_for_seeding(n)
+        return self.fallback.head(n)
+
+    def fallback_recommendations(self, user_input, n=10):
+        """Popular movies the user has not rated"""
+        metrics.POPULAR_FALLBACKS.inc(reason=self.state)
+        rated = {int(k) for k in (user_input.get('seed_ratings') or {})}
+        return self.fallback[~self.fallback['movieId'].isin(rated)].head(n)
+
+    def recommend(self, user_input, n=10):
+        if self.ready:
+            return self.recommender.get_recommendations(user_input, n=n)
+        return self.fallback_recommendations(user_input, n)
+
+    def recommend_batch(self, user_inputs, n=10):
+        if self.ready:
+            return self.recommender.get_recommendations_batch(user_inputs, n=n)
+        return [self.fallback_recommendations(user_input, n) for user_input in user_inputs]
+
+    def fetch_details(self, movie_titles, movie_ids):
+        if self.ready:
+            return self.recommender.fetch_movie_details_many(movie_titles, movie_ids)
+        return [None] * len(movie_titles)
+
+    def status(self):
+        """Load state, current phase and per-phase timings"""
+        now = time.time()
+        with self._lock:
+            phases = list(self.phases)
+            if not self.finished:
+                phases.append({'phase': self.phase, 'seconds': now - self._phase_start})
+        report = {
+            'state': self.state,
+            'phase': self.phase,
+            'phases': phases,
+            'load_seconds': (self.finished or now) - self.started,
+            'fallback_movies': len(self.fallback)
+        }
+        if self.error:
+            report['error'] = self.error
+        return report
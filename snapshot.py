@@ -0,0 +1,211 @@
+"""
+Build-once/load-many model snapshots.
+
+A snapshot is a directory of .npy arrays (memory-mapped on load) and a
+JSON manifest. The manifest carries a dataset key derived
+from the MD5s of the data files, so a snapshot is reused until the
+underlying data (or the snapshot format) changes.
+
+Because the arrays are read-only memory maps, every worker process serving
+the same snapshot shares one copy of them through the OS page cache. Point
+MODEL_SNAPSHOT_PATH at a tmpfs such as /dev/shm to keep them in RAM.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import scipy.sparse as sp
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+SNAPSHOT_VERSION = 4
+MANIFEST = 'manifest.json'
+
+
+def read_checksums(checksums_path):
+    """Parse an md5sum-style file into {file name: md5}"""
+    checksums = {}
+    if not checksums_path or not os.path.exists(checksums_path):
+        return checksums
+    with open(checksums_path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 2:
+                checksums[os.path.basename(parts[1].lstrip('*'))] = parts[0].lower()
+    return checksums
+
+
+def file_md5(path, block_size=1 << 24):
+    """MD5 of a file, read in blocks"""
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cached_file_md5(path, cache_path):
+    """file_md5, remembered in cache_path per (absolute path, size, mtime)"""
+    if not cache_path:
+        return file_md5(path)
+    stat = os.stat(path)
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    entry_key = os.path.abspath(path)
+    try:
+        if os.path.dirname(cache_path):
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Workers starting together wait here while the first one hashes
+        with open(cache_path, 'a+') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    cache = json.loads(f.read() or '{}')
+                except ValueError:
+                    cache = {}
+                entry = cache.get(entry_key)
+                if entry and entry[:2] == stamp:
+                    return entry[2]
+                md5 = file_md5(path)
+                cache[entry_key] = stamp + [md5]
+                f.seek(0)
+                f.truncate()
+                json.dump(cache, f, indent=1)
+                f.flush()
+                return md5
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+    except OSError:
+        return file_md5(path)
+
+
+def dataset_key(paths, checksums_path, extra=(), digest_cache_path=None):
+    """
+    Key identifying the data a model was built from.
+
+    Files whose name is listed in checksums_path use the recorded MD5.
+    Any other file is hashed once and its MD5 is kept in
+    digest_cache_path until its size or mtime changes, so later starts
+    only stat it. File sizes are mixed in so a replaced file is noticed
+    even if the checksum list was not updated. Missing files (dummy data)
+    still give a stable key.
+    """
+    listed = read_checksums(checksums_path)
+    parts = [f'v{SNAPSHOT_VERSION}']
+    for path in paths:
+        name = os.path.basename(path)
+        if not os.path.exists(path):
+            parts.append(f'{name}:missing')
+            continue
+        md5 = listed.get(name) or cached_file_md5(path, digest_cache_path)
+        parts.append(f'{name}:{md5}:{os.path.getsize(path)}')
+    parts.extend(str(item) for item in extra)
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def sparse_to_arrays(prefix, matrix):
+    """Split a CSR matrix into named arrays for saving"""
+    matrix = sp.csr_matrix(matrix)
+    return {
+        f'{prefix}_data': matrix.data,
+        f'{prefix}_indices': matrix.indices,
+        f'{prefix}_indptr': matrix.indptr,
+        f'{prefix}_shape': np.asarray(matrix.shape, dtype=np.int64)
+    }
+
+
+def arrays_to_sparse(prefix, arrays):
+    """Reassemble a CSR matrix saved with sparse_to_arrays (no copy)"""
+    return sp.csr_matrix(
+        (arrays[f'{prefix}_data'], arrays[f'{prefix}_indices'], arrays[f'{prefix}_indptr']),
+        shape=tuple(int(n) for n in arrays[f'{prefix}_shape']),
+        copy=False
+    )
+
+
+def save_snapshot(path, key, arrays, meta=None):
+    """Write a snapshot atomically: build in a temp dir, then swap it in"""
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.snapshot-', dir=parent)
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, f'{name}.npy'), np.ascontiguousarray(array))
+        manifest = {
+            'version': SNAPSHOT_VERSION,
+            'key': key,
+            'created': time.time(),
+            'arrays': sorted(arrays),
+            'meta': meta or {}
+        }
+        with open(os.path.join(staging, MANIFEST), 'w') as f:
+            json.dump(manifest, f)
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(staging, path)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+@contextmanager
+def build_lock(path):
+    """Exclusive lock next to a snapshot, held while it is loaded or built"""
+    if not path or fcntl is None:
+        yield
+        return
+    path = os.path.abspath(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_manifest(path):
+    """Return a snapshot's manifest, or None if there is no valid snapshot"""
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_snapshot(path, key, mmap=True):
+    """
+    Load a snapshot if it matches key.
+
+    Returns (arrays, meta), or None when the snapshot is missing,
+    stale or unreadable. Arrays are read-only memory maps by default.
+    """
+    manifest = read_manifest(path)
+    if manifest is None:
+        return None
+    if manifest.get('version') != SNAPSHOT_VERSION or manifest.get('key') != key:
+        print("⚠ Model snapshot is stale, rebuilding...")
+        return None
+
+    mmap_mode = 'r' if mmap else None
+    try:
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+            for name in manifest['arrays']
+        }
+    except (OSError, ValueError) as e:
+        print(f"⚠ Could not load model snapshot: {e}")
+        return None
+    return arrays, manifest['meta']
@@ -0,0 +1,101 @@
+"""
+MetadataClient.fetch_many against a local stand-in for the OMDb API.
+
+Run with: python -m pytest tests (or python -m unittest discover tests)
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from metadata import MetadataClient, MetadataStore
+
+SLOW_SECONDS = 1.5
+
+
+class StandInOMDb(BaseHTTPRequestHandler):
+    """Answers OMDb title lookups; titles starting with 'Slow' take SLOW_SECONDS"""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        title = params.get('t', '')
+        self.server.requests.append((title, self.client_address))
+        if title.startswith('Slow'):
+            time.sleep(SLOW_SECONDS)
+
+        body = json.dumps({
+            'Response': 'True', 'Title': title, 'Poster': f'http://posters/{title}.jpg',
+            'Plot': f'Plot of {title}', 'Released': '2000', 'imdbRating': '7.5'
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FetchManyTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInOMDb)
+        self.server.daemon_threads = True
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def client(self, max_workers=4, store=None):
+        return MetadataClient('omdb', 'test-key', self.base_url, timeout=5.0, max_workers=max_workers, store=store)
+
+    def test_slow_movie_misses_the_page_deadline(self):
+        client = self.client()
+        start = time.time()
+        results = client.fetch_many(['Fast One', 'Slow One', 'Fast Two'], deadline=0.5)
+        elapsed = time.time() - start
+
+        self.assertLess(elapsed, SLOW_SECONDS)
+        self.assertEqual(results[0]['overview'], 'Plot of Fast One')
+        self.assertIsNone(results[1])
+        self.assertEqual(results[2]['overview'], 'Plot of Fast Two')
+
+    def test_lookups_reuse_one_connection(self):
+        client = self.client(max_workers=1)
+        titles = [f'Movie {i}' for i in range(5)]
+        results = client.fetch_many(titles, deadline=5.0)
+
+        self.assertTrue(all(result is not None for result in results))
+        self.assertEqual([title for title, _ in self.server.requests], titles)
+        # Every request arrived from the same client socket
+        self.assertEqual(len({address for _, address in self.server.requests}), 1)
+
+    def test_cached_movies_make_no_request(self):
+        store = MetadataStore(os.path.join(self.tmp.name, 'metadata.sqlite3'))
+        try:
+            client = self.client(store=store)
+            first = client.fetch_many(['Movie A', 'Movie B'], deadline=5.0, movie_ids=[1, 2])
+            self.assertEqual(len(self.server.requests), 2)
+
+            self.server.requests.clear()
+            second = client.fetch_many(['Movie A', 'Movie B'], deadline=5.0, movie_ids=[1, 2])
+            self.assertEqual(second, first)
+            self.assertEqual(self.server.requests, [])
+        finally:
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+prefetch() against the local stand-in for the OMDb API.
+
+Run with: python -m pytest tests (or python -m unittest discover tests)
+"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer
+
+from metadata import MetadataClient, MetadataStore
+from prefetch import TokenBucket, prefetch, read_checkpoint
+from tests.test_metadata import StandInOMDb
+
+
+class InterruptingClient(MetadataClient):
+    """Stops the run (like Ctrl-C) when it reaches stop_at"""
+
+    stop_at = None
+
+    def refresh(self, movie_title, movie_id=None):
+        if movie_id == self.stop_at:
+            # Let the lookups already in flight finish first
+            time.sleep(0.2)
+            raise KeyboardInterrupt
+        return super().refresh(movie_title, movie_id)
+
+
+class PrefetchTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInOMDb)
+        self.server.daemon_threads = True
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = MetadataStore(os.path.join(self.tmp.name, 'metadata.sqlite3'))
+        self.checkpoint_path = os.path.join(self.tmp.name, 'prefetch.json')
+        self.movie_ids = list(range(1, 21))
+        self.titles = {movie_id: f'Movie {movie_id}' for movie_id in self.movie_ids}
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.store.close()
+        self.tmp.cleanup()
+
+    def client(self, cls=MetadataClient):
+        return cls('omdb', 'test-key', self.base_url, timeout=5.0, max_workers=4, store=self.store)
+
+    def run_prefetch(self, client=None, **kwargs):
+        options = dict(rate=1000.0, workers=4, checkpoint_every=5, verbose=False)
+        options.update(kwargs)
+        return prefetch(client or self.client(), self.movie_ids, self.titles, self.checkpoint_path, **options)
+
+    def requested(self):
+        return sorted(int(title.split()[-1]) for title, _ in self.server.requests)
+
+    def test_token_bucket_rate(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        start = time.monotonic()
+        for _ in range(11):
+            bucket.acquire()
+        # The first token is there from the start, the other ten take 1/20 s each
+        self.assertGreaterEqual(time.monotonic() - start, 0.45)
+
+    def test_lookups_are_rate_limited(self):
+        start = time.monotonic()
+        checkpoint = self.run_prefetch(rate=10.0)
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(checkpoint['counts']['found'], len(self.movie_ids))
+        # A burst of 10, then the other 10 lookups at 10 per second
+        self.assertGreaterEqual(elapsed, 0.9)
+
+    def test_resume_counts_every_movie_once(self):
+        client = self.client(InterruptingClient)
+        client.stop_at = 8
+        with self.assertRaises(KeyboardInterrupt):
+            self.run_prefetch(client)
+        interrupted = read_checkpoint(self.checkpoint_path)
+        self.assertFalse(interrupted['complete'])
+        self.assertLessEqual(interrupted['position'], 7)
+        self.assertEqual(sum(interrupted['counts'].values()), interrupted['position'])
+
+        self.server.requests.clear()
+        checkpoint = self.run_prefetch()
+        self.assertTrue(checkpoint['complete'])
+        self.assertEqual(checkpoint['counts']['found'], len(self.movie_ids))
+        self.assertEqual(sum(checkpoint['counts'].values()), len(self.movie_ids))
+        # Only the movies from the checkpoint position on are looked up again
+        self.assertEqual(self.requested(), self.movie_ids[interrupted['position']:])
+
+    def test_incremental_skips_cached_movies(self):
+        self.run_prefetch()
+        self.assertEqual(self.requested(), self.movie_ids)
+
+        self.server.requests.clear()
+        self.store.put(5, 'omdb', 'title:Movie 5', None, fetched=1)  # long expired
+        checkpoint = self.run_prefetch(incremental=True)
+        self.assertEqual(self.requested(), [5])
+        self.assertEqual(checkpoint['counts']['skipped'], len(self.movie_ids) - 1)
+        self.assertEqual(checkpoint['counts']['found'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
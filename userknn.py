@@ -0,0 +1,95 @@
+"""
+User-user neighborhood scoring for session users.
+
+A session user (the seed ratings from /step2) is compared only with the
+users who rated at least one of the seeds. Those are found through the
+inverted index the model already holds, item_user_matrix (one CSR row per
+movie listing the users who rated it, sorted), so the cost is bounded by
+max_candidates, not by the number of users or how often the seeds were
+rated (the /step2 seeds are the most popular movies):
+
+1. Gather at most max_candidates raters of the seeds. Seeds share the
+   budget; a seed rated by more users than its share contributes an
+   evenly spaced sample of its raters.
+2. Cosine similarity between the session and each candidate: each
+   candidate's seed ratings are binary-searched in the seed rows.
+3. The ratings of the k most similar candidates, weighted by similarity,
+   score every movie.
+"""
+
+import numpy as np
+
+from incremental import row_norms
+
+
+class UserNeighborIndex:
+    """User-user KNN over the inverted movie -> raters index"""
+
+    def __init__(self, user_item_matrix, item_user_matrix, k=50, max_candidates=20000):
+        self.user_item_matrix = user_item_matrix
+        # Rater lists are binary-searched, so they must be sorted
+        if not item_user_matrix.has_sorted_indices:
+            item_user_matrix = item_user_matrix.sorted_indices()
+        self.item_user_matrix = item_user_matrix
+        self.k = k
+        self.max_candidates = max_candidates
+        self.user_norms = row_norms(user_item_matrix)
+
+    def candidates(self, seed_cols):
+        """Sorted user rows of at most max_candidates raters of the seeds"""
+        indptr, indices = self.item_user_matrix.indptr, self.item_user_matrix.indices
+        seed_cols = np.asarray(seed_cols, dtype=np.int64)
+        counts = indptr[seed_cols + 1] - indptr[seed_cols]
+        budget = self.max_candidates
+        raters = []
+        # Rarely rated seeds go first, so the share they leave unused goes to the rest
+        for i, seed in enumerate(np.argsort(counts, kind='stable')):
+            share = budget // (len(seed_cols) - i)
+            start, count = indptr[seed_cols[seed]], counts[seed]
+            if count > share:
+                picked = indices[start + np.linspace(0, count - 1, share).astype(np.int64)]
+            else:
+                picked = indices[start:start + count]
+            raters.append(picked)
+            budget -= len(picked)
+        if not raters:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(raters))
+
+    def seed_dots(self, seed_cols, seed_values, users):
+        """Dot product of the seed ratings with each candidate's ratings of the seeds"""
+        matrix = self.item_user_matrix
+        dots = np.zeros(len(users), dtype=np.float64)
+        for col, value in zip(seed_cols, seed_values):
+            start, stop = matrix.indptr[col], matrix.indptr[col + 1]
+            if start == stop:
+                continue
+            pos = np.minimum(np.searchsorted(matrix.indices[start:stop], users), stop - start - 1)
+            rated = matrix.indices[start + pos] == users
+            dots[rated] += value * matrix.data[start + pos[rated]]
+        return dots
+
+    def neighbors(self, seed_cols, seed_values):
+        """(user rows, cosine similarities) of the k nearest users, best first"""
+        users = self.candidates(seed_cols)
+        if len(users) == 0:
+            return users, np.empty(0, dtype=np.float64)
+
+        dots = self.seed_dots(seed_cols, seed_values, users)
+        norms = self.user_norms[users] * np.linalg.norm(seed_values)
+        similarities = np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+
+        k = min(self.k, len(users))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top], kind='stable')]
+        top = top[similarities[top] > 0]
+        return users[top], similarities[top]
+
+    def score(self, seed_cols, seed_values):
+        """Similarity-weighted sum of the neighbors' ratings, one score per movie"""
+        n_items = self.user_item_matrix.shape[1]
+        users, similarities = self.neighbors(seed_cols, np.asarray(seed_values, dtype=np.float64))
+        if len(users) == 0:
+            return np.zeros(n_items)
+        # Only the k neighbors' rows are touched
+        return np.asarray(self.user_item_matrix[users].T @ similarities, dtype=np.float64).ravel()